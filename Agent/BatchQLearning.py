@@ -0,0 +1,139 @@
+from Yahtzee import YahtzeeBatch, DICE_COMBINATIONS, NUM_DICE, NUM_DICE_COMBINATIONS, NUM_REROLL_STATES
+from DiceTransitions import KEEPS, KEEP_ALL, ROLL_KEEP_CHOICES, ROLL_KEEP_INDPTR, keep_mask
+from QTable import QTable, KEEP_ACTION, N_ACTIONS, N_REROLL_ACTIONS
+import numpy as np
+
+## Q-learning on K games at once, with the encoded states, action ids and Q-table of QTable.py.
+##
+## Every step picks the epsilon-greedy actions of all the games with one argmax over their Q-table rows
+## (illegal actions masked out), plays them on a YahtzeeBatch, and applies the K TD updates with one scatter.
+## Games that end are restarted in the same step, so every step plays K transitions.
+## The learned table is the one of QLearningAgent: it can be played by setting agent.qValues to it.
+##
+## Dice are kept sorted, so that a reroll id maps to a fixed mask of the dice of its dice index.
+## Updates of one step are applied together: several games updating the same (state, action) in a step
+## move it by alpha times their mean TD error, as a single update with the mean target would.
+
+NUM_ENVS = 1024
+
+## REROLL_LEGAL[dice index, id] = whether the reroll id is a keep of the dice (and not the keep of all of them)
+REROLL_LEGAL = np.zeros((NUM_DICE_COMBINATIONS, N_REROLL_ACTIONS), dtype=bool)
+## REROLL_KEEP_MASKS[dice index, id] = dice kept (True) by the reroll id, on sorted dice
+REROLL_KEEP_MASKS = np.zeros((NUM_DICE_COMBINATIONS, N_REROLL_ACTIONS, NUM_DICE), dtype=bool)
+for _roll, _dice in enumerate(DICE_COMBINATIONS):
+    _n_keeps = ROLL_KEEP_INDPTR[_roll + 1] - ROLL_KEEP_INDPTR[_roll]
+    REROLL_LEGAL[_roll, :_n_keeps] = ROLL_KEEP_CHOICES[_roll, :_n_keeps] != KEEP_ALL[_roll]
+    for _action_id, _keep in enumerate(ROLL_KEEP_CHOICES[_roll, :_n_keeps].tolist()):
+        REROLL_KEEP_MASKS[_roll, _action_id] = keep_mask(_dice, KEEPS[_keep])
+
+
+class BatchQLearner:
+
+    def __init__(self, alpha: float = 0.5, epsilon: float = 0.3, gamma: float = 1, num_envs: int = NUM_ENVS,
+                 seed=None, qValues: QTable = None):
+        """
+        Q-learning with the hyperparameters of QLearningAgent, on num_envs games played in lockstep.
+        seed seeds both the dice and the exploration. qValues resumes from a QTable (a new one by default).
+        """
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.discount = gamma
+        self.qValues = QTable() if qValues is None else qValues
+        self.rng = np.random.default_rng(seed)
+        self.envs = YahtzeeBatch(num_envs, seed=self.rng.integers(1 << 63))
+        self.envs.dice.sort(axis=1)
+        self.returns = np.zeros(num_envs)
+        self.transitions = 0
+
+    def state_codes(self):
+        """
+        Returns the QTable.encode_state() code of the state of every game.
+        """
+        return ((self.envs.get_available_mask() * NUM_REROLL_STATES + self.envs.rerolls) * NUM_DICE_COMBINATIONS
+                + self.envs.dice_indices())
+
+    def legal_actions(self):
+        """
+        Returns a (num_envs, N_ACTIONS) boolean array of the legal action ids of every game (see actionFn).
+        """
+        rerolls = REROLL_LEGAL[self.envs.dice_indices()] & (self.envs.rerolls > 0)[:, None]
+        return np.concatenate([rerolls, self.envs.get_available_categories()], axis=1)
+
+    def step(self):
+        """
+        Plays one epsilon-greedy transition in every game and updates the Q-table.
+        Returns the returns of the games that ended (and were restarted).
+        """
+        envs = self.envs
+        num_envs = envs.num_games
+        rows = self.qValues.insert_many(self.state_codes())
+        values = self.qValues.values  # after insert_many(), which may grow it
+        legal = self.legal_actions()
+        dice_indices = envs.dice_indices()
+
+        ## Greedy actions take the first best legal id, like QLearningAgent; random ones are uniform over the legal ids
+        greedy = np.argmax(np.where(legal, values[rows], -np.inf), axis=1)
+        explore = np.argmax(np.where(legal, self.rng.random((num_envs, N_ACTIONS)), -1.0), axis=1)
+        actions = np.where(self.rng.random(num_envs) < self.epsilon, explore, greedy)
+
+        rerolling = actions < KEEP_ACTION
+        scoring = ~rerolling
+        categories = np.where(scoring, actions - KEEP_ACTION, 0)
+        rewards = np.where(scoring, envs.getScore(categories), 0)
+        envs.write_score(categories, scoring)
+        envs.roll_dice(REROLL_KEEP_MASKS[dice_indices, np.minimum(actions, N_REROLL_ACTIONS - 1)], rerolling)
+        envs.dice.sort(axis=1)
+
+        ## TD targets: the value of an ended game is 0, and unvisited next states have zero Q-values
+        over = envs.is_over()
+        next_rows = self.qValues.find_many(self.state_codes())
+        next_values = np.where(self.legal_actions(), values[np.maximum(next_rows, 0)], -np.inf).max(axis=1)
+        next_values[(next_rows < 0) | over] = 0.0
+        errors = rewards + self.discount * next_values - values[rows, actions]
+
+        _, inverse, counts = np.unique(rows * N_ACTIONS + actions, return_inverse=True, return_counts=True)
+        np.add.at(values, (rows, actions), self.alpha * errors / counts[inverse])
+        self.qValues.clear_best(rows)  # written without QTable.set()
+
+        self.returns += rewards
+        self.transitions += num_envs
+        ended = self.returns[over].copy()
+        if len(ended):
+            envs.reset(over)
+            envs.dice.sort(axis=1)
+            self.returns[over] = 0
+        return ended
+
+    def train(self, episodes: int):
+        """
+        Steps until at least the given number of episodes ended, and returns their returns in order of completion.
+        Games still running at the end carry on in the next call.
+        """
+        returns = []
+        n_returns = 0
+        while n_returns < episodes:
+            ended = self.step()
+            returns.append(ended)
+            n_returns += len(ended)
+        return np.concatenate(returns)[:episodes]
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description = "Trains the Q-learning agent on a batch of games.")
+    parser.add_argument('--episodes', type = int, default = 100000, help = "number of episodes")
+    parser.add_argument('--envs', type = int, default = NUM_ENVS, help = "number of games played at once")
+    parser.add_argument('--lr', type = float, default = 0.5, help = "learning rate")
+    parser.add_argument('--eps', type = float, default = 0.3, help = "exploration rate")
+    parser.add_argument('--seed', type = int, default = 0, help = "seed of the dice and the exploration")
+    args = parser.parse_args()
+
+    learner = BatchQLearner(args.lr, args.eps, num_envs = args.envs, seed = args.seed)
+    start_time = time.perf_counter()
+    returns = learner.train(args.episodes)
+    elapsed = time.perf_counter() - start_time
+    print(f"Transitions per second = {learner.transitions / elapsed:.0f}")
+    print(f"Mean return = {returns.mean():.2f}, last 10% = {returns[-len(returns) // 10:].mean():.2f}")
+    print(f"States visited = {len(learner.qValues)}")
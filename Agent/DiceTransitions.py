@@ -0,0 +1,114 @@
+from Yahtzee import DIE_CHOICES, NUM_DICE, DICE_COMBINATIONS, NUM_DICE_COMBINATIONS, dice_index
+from collections import Counter
+from itertools import combinations, combinations_with_replacement
+from math import factorial
+from typing import List, Tuple
+import numpy as np
+
+## Dice transitions shared by solvers and agents, computed once at import.
+##
+## Keeps are the multisets of 0 to NUM_DICE dice that can be held before a reroll (462 of them),
+## as sorted tuples. Rolls are the NUM_DICE_COMBINATIONS sorted dice multisets of Yahtzee.DICE_COMBINATIONS.
+## Both directions are stored as CSR-style arrays:
+##   keep -> roll: the rolls reachable by rerolling the dice not kept, with their probabilities
+##   roll -> keep: the keeps that can be held from a roll
+
+
+def _build_keeps():
+    keeps = []
+    for n_kept in range(NUM_DICE + 1):
+        keeps.extend(combinations_with_replacement(DIE_CHOICES, n_kept))
+    return keeps
+
+
+def _outcome_probability(outcome):
+    ## Probability of rolling a given multiset of dice
+    permutations = factorial(len(outcome))
+    for count in Counter(outcome).values():
+        permutations //= factorial(count)
+    return permutations / len(DIE_CHOICES) ** len(outcome)
+
+
+def _build_keep_rolls(keeps):
+    indptr = [0]
+    indices = []
+    data = []
+    for kept in keeps:
+        row = {}
+        for outcome in combinations_with_replacement(DIE_CHOICES, NUM_DICE - len(kept)):
+            roll = dice_index(kept + outcome)
+            row[roll] = row.get(roll, 0) + _outcome_probability(outcome)
+        for roll in sorted(row):
+            indices.append(roll)
+            data.append(row[roll])
+        indptr.append(len(indices))
+    return np.array(indptr), np.array(indices), np.array(data)
+
+
+def _build_roll_keeps(keep_index):
+    indptr = [0]
+    indices = []
+    for dice in DICE_COMBINATIONS:
+        kept = {subset for n_kept in range(NUM_DICE + 1) for subset in combinations(dice, n_kept)}
+        indices.extend(sorted(keep_index[subset] for subset in kept))
+        indptr.append(len(indices))
+    return np.array(indptr), np.array(indices)
+
+
+KEEPS: List[Tuple[int, ...]] = _build_keeps()
+NUM_KEEPS = len(KEEPS)
+KEEP_INDEX = {kept: k for k, kept in enumerate(KEEPS)}
+KEEP_ALL = np.array([KEEP_INDEX[dice] for dice in DICE_COMBINATIONS])  # keep of every roll holding all its dice
+KEEP_NONE = KEEP_INDEX[()]
+
+KEEP_ROLL_INDPTR, KEEP_ROLL_INDICES, KEEP_ROLL_DATA = _build_keep_rolls(KEEPS)
+ROLL_KEEP_INDPTR, ROLL_KEEP_INDICES = _build_roll_keeps(KEEP_INDEX)
+
+## Dense copies, for batched products (BLAS beats the sparse product once there are many columns)
+KEEP_ROLL_DENSE = np.zeros((NUM_KEEPS, NUM_DICE_COMBINATIONS))
+KEEP_ROLL_DENSE[np.repeat(np.arange(NUM_KEEPS), np.diff(KEEP_ROLL_INDPTR)), KEEP_ROLL_INDICES] = KEEP_ROLL_DATA
+FIRST_ROLL = KEEP_ROLL_DENSE[KEEP_NONE]  # probabilities of the rolls of all dice
+
+## ROLL_KEEP_CHOICES[r] = keeps of roll r, padded by repeating the last one so that every roll has the same width
+ROLL_KEEP_CHOICES = np.array([
+    np.pad(ROLL_KEEP_INDICES[start:end], (0, np.diff(ROLL_KEEP_INDPTR).max() - (end - start)), mode = 'edge')
+    for start, end in zip(ROLL_KEEP_INDPTR[:-1], ROLL_KEEP_INDPTR[1:])
+])
+
+
+def keep_roll_probabilities(k):
+    ## Returns (rolls, probabilities) reachable from keep k
+    start, end = KEEP_ROLL_INDPTR[k], KEEP_ROLL_INDPTR[k + 1]
+    return KEEP_ROLL_INDICES[start:end], KEEP_ROLL_DATA[start:end]
+
+
+def roll_keeps(r):
+    ## Returns the keeps that can be held from roll r
+    return ROLL_KEEP_INDICES[ROLL_KEEP_INDPTR[r]:ROLL_KEEP_INDPTR[r + 1]]
+
+
+def expected_keep_values(roll_values):
+    ## Expected value of every keep after rerolling, given values of the rolls.
+    ## roll_values has shape (NUM_DICE_COMBINATIONS,) or (NUM_DICE_COMBINATIONS, n)
+    if roll_values.ndim == 1:
+        return np.add.reduceat(KEEP_ROLL_DATA * roll_values[KEEP_ROLL_INDICES], KEEP_ROLL_INDPTR[:-1])
+    return KEEP_ROLL_DENSE @ roll_values
+
+
+def best_keep_values(keep_values):
+    ## Value of every roll when holding its best keep, given values of the keeps.
+    ## keep_values has shape (NUM_KEEPS,) or (NUM_KEEPS, n)
+    return keep_values[ROLL_KEEP_CHOICES].max(axis = 1)
+
+
+def keep_mask(dice, kept):
+    ## Converts a kept multiset into the list of booleans (True to keep) over the given dice
+    remaining = list(kept)
+    mask = []
+    for die in dice:
+        if die in remaining:
+            remaining.remove(die)
+            mask.append(True)
+        else:
+            mask.append(False)
+    return mask
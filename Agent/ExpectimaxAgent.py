@@ -0,0 +1,213 @@
+from Agent import Agent
+from Yahtzee import (
+    Yahtzee,
+    NUM_UPPER,
+    BONUS_THRESHOLD,
+    BONUS_SCORE,
+    NUM_DICE_COMBINATIONS,
+    NUM_UPPER_SCORES,
+    NUM_REROLL_STATES,
+    NUM_ENCODED_STATES,
+    SCORE_TABLE,
+    dice_index,
+)
+from FullGameSolver import NUM_CATEGORIES_TO_FILL, UPPER_NEXT, UPPER_REWARD, turn_values
+from DiceTransitions import KEEPS, KEEP_ALL, NUM_KEEPS, FIRST_ROLL, keep_roll_probabilities, roll_keeps, keep_mask
+from typing import List, Literal, Tuple, Union
+import time
+import numpy as np
+
+## Expectimax search over the rerolls of the current turn, for the full game in Yahtzee.py.
+##
+## The tree of a turn alternates roll nodes (pick the best of scoring a category or holding a keep)
+## and chance nodes (expectation over the rolls of a keep), with the transitions of DiceTransitions.
+## Scoring a category ends the turn: its value is the score written (with the upper bonus) plus a
+## leaf heuristic, an estimate of the score still to be made from the start of the next turn.
+##
+## The search deepens iteratively over the number of rerolls considered, until the rerolls left or the
+## time budget of the move run out. A search limited to d rerolls is the exact tree of the same state
+## with min(rerolls left, d) rerolls, so values of every depth share one transposition table, keyed by
+## the encoded state (see Yahtzee.encode_state) with that number of rerolls.
+
+TIME_BUDGET = 0.1  # seconds per move
+TABLE_SIZE = 1 << 20  # entries of the transposition table before it is cleared
+NODES_PER_TIME_CHECK = 256
+
+_KEEP_ALL = KEEP_ALL.tolist()
+
+
+## Leaf heuristics take (available category mask, upper score capped at BONUS_THRESHOLD) at the start of a turn
+## and return an estimate of the expected score still to be made.
+
+def zero_heuristic(available_mask, upper_score):
+    ## Ignores the future: the search then maximizes the score of the current turn
+    return 0.0
+
+
+def _category_turn_values():
+    ## Expected score of every category when it is the only one left, with optimal rerolls
+    next_values = np.zeros((1, NUM_UPPER_SCORES))
+    return [float(FIRST_ROLL @ turn_values(next_values, 1 << category, [0])[0][-1, :, 0])
+            for category in range(NUM_CATEGORIES_TO_FILL)]
+
+
+CATEGORY_TURN_VALUES = _category_turn_values()
+
+
+def category_heuristic(available_mask, upper_score):
+    ## Sum of the single-category values of the available categories, plus the bonus if scoring three dice
+    ## of each available upper category would reach it
+    value = 0.0
+    par_upper_score = upper_score
+    for category in range(NUM_CATEGORIES_TO_FILL):
+        if available_mask >> category & 1:
+            value += CATEGORY_TURN_VALUES[category]
+            if category < NUM_UPPER:
+                par_upper_score += 3 * (category + 1)
+    if upper_score < BONUS_THRESHOLD <= par_upper_score:
+        value += BONUS_SCORE
+    return value
+
+
+def value_table_heuristic(value_table):
+    ## Exact values of FullGameSolver: searching every reroll then plays like OptimalAgent
+    return lambda available_mask, upper_score: value_table[available_mask, upper_score]
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class ExpectimaxAgent(Agent):
+    def __init__(
+            self,
+            game : Yahtzee,
+            heuristic = category_heuristic,
+            time_budget = TIME_BUDGET,
+            rounds = NUM_CATEGORIES_TO_FILL,
+            table_size = TABLE_SIZE,
+            *args, **kwargs):
+        super().__init__(game, rounds, *args, **kwargs)
+        self.heuristic = heuristic
+        self.time_budget = time_budget
+        self.table_size = table_size
+        self.transpositions = {}
+        self.depths = []  # (rerolls searched, rerolls left) at every move
+        self._turn = None
+
+    def get_agent_name(self):
+        return "Expectimax Agent"
+
+    def get_action(
+        self,
+        dice: List[int],
+        rerolls: int,
+        available_categories: List[str]
+    ) -> Tuple[Literal['REROLL', 'KEEP'], Union[List[bool], int]]:
+        deadline = time.perf_counter() + self.time_budget
+        self._start_turn(self.game.get_available_mask(), min(self.game.get_upper_score(), BONUS_THRESHOLD))
+        roll = dice_index(dice)
+
+        ## Depth 0 scores the current dice; every deeper search that completes in time replaces its choice
+        keep, depth = None, 0
+        for search_depth in range(1, rerolls + 1):
+            try:
+                keep = self._search_root(roll, search_depth, deadline)
+            except _SearchTimeout:
+                break
+            depth = search_depth
+        self.depths.append((depth, rerolls))
+
+        if keep is None:
+            return ('KEEP', self._best_category[roll])
+        return ('REROLL', keep_mask(dice, KEEPS[keep]))
+
+    def _start_turn(self, available_mask, upper_score):
+        ## Computes the value of ending the turn with every roll, when the score state changes
+        if self._turn == (available_mask, upper_score):
+            return
+        self._turn = (available_mask, upper_score)
+        self._base_code = (available_mask * NUM_UPPER_SCORES + upper_score) * NUM_REROLL_STATES
+        self._chance_base_code = NUM_ENCODED_STATES + self._base_code * NUM_KEEPS
+
+        category_values = np.full((NUM_CATEGORIES_TO_FILL, NUM_DICE_COMBINATIONS), -np.inf)
+        for category in range(NUM_CATEGORIES_TO_FILL):
+            if not available_mask >> category & 1:
+                continue
+            next_mask = available_mask & ~(1 << category)
+            if category < NUM_UPPER:
+                next_uppers = UPPER_NEXT[category][:, upper_score]
+                leaf_values = {next_upper: self.heuristic(next_mask, next_upper) for next_upper in set(next_uppers.tolist())}
+                category_values[category] = (UPPER_REWARD[category][:, upper_score]
+                                             + np.array([leaf_values[next_upper] for next_upper in next_uppers.tolist()]))
+            else:
+                category_values[category] = SCORE_TABLE[:, category] + self.heuristic(next_mask, upper_score)
+        self._best_category = np.argmax(category_values, axis = 0).tolist()
+        self._score_values = np.max(category_values, axis = 0).tolist()
+
+    def _search_root(self, roll, rerolls, deadline):
+        ## Returns the best keep to reroll with (None to score the dice), searching the given number of rerolls
+        self._deadline = deadline
+        self._nodes = 0
+        best_keep, best_value = None, self._score_values[roll]
+        for keep in roll_keeps(roll).tolist():
+            if keep == _KEEP_ALL[roll]:
+                continue
+            value = self._chance_value(keep, rerolls - 1)
+            if value > best_value:
+                best_keep, best_value = keep, value
+        return best_keep
+
+    def _roll_value(self, roll, rerolls):
+        if rerolls == 0:
+            return self._score_values[roll]
+        code = (self._base_code + rerolls) * NUM_DICE_COMBINATIONS + roll
+        value = self.transpositions.get(code)
+        if value is None:
+            value = self._score_values[roll]
+            for keep in roll_keeps(roll).tolist():
+                if keep != _KEEP_ALL[roll]:
+                    value = max(value, self._chance_value(keep, rerolls - 1))
+            self._store(code, value)
+        return value
+
+    def _chance_value(self, keep, rerolls):
+        code = self._chance_base_code + rerolls * NUM_KEEPS + keep
+        value = self.transpositions.get(code)
+        if value is None:
+            self._nodes += 1
+            if self._nodes % NODES_PER_TIME_CHECK == 0 and time.perf_counter() > self._deadline:
+                raise _SearchTimeout()
+            rolls, probabilities = keep_roll_probabilities(keep)
+            value = sum(probability * self._roll_value(next_roll, rerolls)
+                        for next_roll, probability in zip(rolls.tolist(), probabilities.tolist()))
+            self._store(code, value)
+        return value
+
+    def _store(self, code, value):
+        if len(self.transpositions) >= self.table_size:
+            self.transpositions.clear()
+        self.transpositions[code] = value
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Plays the full game with the expectimax agent.")
+    parser.add_argument('--games', type = int, default = 100, help = "number of games to play")
+    parser.add_argument('--time-budget', type = float, default = TIME_BUDGET, help = "seconds per move")
+    parser.add_argument('--heuristic', choices = ['category', 'zero'], default = 'category', help = "leaf heuristic")
+    args = parser.parse_args()
+
+    heuristic = {'category': category_heuristic, 'zero': zero_heuristic}[args.heuristic]
+    scores = []
+    depths = []
+    start_time = time.perf_counter()
+    for _ in range(args.games):
+        agent = ExpectimaxAgent(Yahtzee(log_mode = 'none'), heuristic, args.time_budget)
+        scores.append(agent.play_game())
+        depths.extend(agent.depths)
+    print(f"Time per move = {(time.perf_counter() - start_time) / len(depths) * 1e3:.2f}ms")
+    print(f"Moves searched to every reroll left: {np.mean([depth == rerolls for depth, rerolls in depths]):.2%}")
+    print(f"Mean: {np.mean(scores)}")
+    print(f"Std Dev: {np.std(scores)}")
@@ -0,0 +1,193 @@
+from Yahtzee import (
+    NUM_UPPER,
+    NUM_CATEGORIES,
+    BONUS_THRESHOLD,
+    BONUS_SCORE,
+    NUM_DICE_COMBINATIONS,
+    SCORE_TABLE,
+    NUM_CATEGORY_MASKS,
+    NUM_UPPER_SCORES,
+    ALL_CATEGORIES_MASK,
+)
+from DiceTransitions import NUM_KEEPS, FIRST_ROLL, expected_keep_values, best_keep_values
+import ValueTable
+import SolverProgress
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+import time
+import numpy as np
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # BLAS thread limits of the workers are optional
+    threadpool_limits = None
+
+## Optimal solitaire solver for the full game in Yahtzee.py (13 categories and the upper section bonus).
+##
+## A turn-start state is (available category mask, upper section score capped at BONUS_THRESHOLD),
+## giving a (NUM_CATEGORY_MASKS, NUM_UPPER_SCORES) table of expected final scores.
+## Each turn is solved as a widget over the dice: the value of every roll after the last reroll,
+## then of every kept multiset, then of every roll before a reroll, and so on back to the first roll.
+## A state only depends on states with one more category filled, so masks are solved in order of
+## increasing number of available categories.
+
+NUM_CATEGORIES_TO_FILL = NUM_CATEGORIES - 1
+NUM_ROLLS = 3  # initial roll and two rerolls
+RULESET = 'yahtzee13'
+VALUE_TABLE_FILE = 'optimal_value_table.bin'
+
+
+UPPER_SCORES = np.arange(NUM_UPPER_SCORES)
+## Upper section score and reward (including bonus) after writing category c, indexed by [c, roll, upper score]
+UPPER_NEXT = np.minimum(UPPER_SCORES + SCORE_TABLE[:, :NUM_UPPER].T[:, :, None].astype(int), BONUS_THRESHOLD)
+UPPER_REWARD = (SCORE_TABLE[:, :NUM_UPPER].T[:, :, None]
+                + BONUS_SCORE * ((UPPER_SCORES < BONUS_THRESHOLD) & (UPPER_NEXT >= BONUS_THRESHOLD)))
+
+
+def turn_values(value_table, available_mask, upper_scores = UPPER_SCORES):
+    ## Solves the widget of one turn, for every given upper section score.
+    ## Returns the values of rolls with 0, 1 and 2 rerolls left, shape (NUM_ROLLS, NUM_DICE_COMBINATIONS, len(upper_scores)),
+    ## and the values of kept multisets with 1 and 2 rerolls left, shape (NUM_ROLLS - 1, NUM_KEEPS, len(upper_scores)).
+    roll_values = np.empty((NUM_ROLLS, NUM_DICE_COMBINATIONS, len(upper_scores)))
+    keep_values = np.empty((NUM_ROLLS - 1, NUM_KEEPS, len(upper_scores)))
+
+    roll_values[0] = category_values(value_table, available_mask, upper_scores).max(axis = 0)
+    for n_rerolls_left in range(1, NUM_ROLLS):
+        keep_values[n_rerolls_left - 1] = expected_keep_values(roll_values[n_rerolls_left - 1])
+        roll_values[n_rerolls_left] = best_keep_values(keep_values[n_rerolls_left - 1])
+    return roll_values, keep_values
+
+
+def category_values(value_table, available_mask, upper_scores = UPPER_SCORES):
+    ## Value of writing each category with each roll, shape (NUM_CATEGORIES_TO_FILL, NUM_DICE_COMBINATIONS, len(upper_scores)).
+    ## Unavailable categories are set to -inf.
+    values = np.full((NUM_CATEGORIES_TO_FILL, NUM_DICE_COMBINATIONS, len(upper_scores)), -np.inf)
+    for category in range(NUM_CATEGORIES_TO_FILL):
+        if not available_mask >> category & 1:
+            continue
+        next_values = value_table[available_mask & ~(1 << category)]
+        if category < NUM_UPPER:
+            values[category] = (UPPER_REWARD[category][:, upper_scores]
+                                + next_values[UPPER_NEXT[category][:, upper_scores]])
+        else:
+            values[category] = SCORE_TABLE[:, category, None] + next_values[upper_scores]
+    return values
+
+
+def solve_score_table(value_table, available_mask):
+    ## Expected final scores from the start of a turn with the given available categories, for every upper score
+    roll_values, _ = turn_values(value_table, available_mask)
+    return FIRST_ROLL @ roll_values[NUM_ROLLS - 1]
+
+
+def solve_full_game(workers = 1, verbose = True, checkpoint = None, resume = False,
+                    n_layers = NUM_CATEGORIES_TO_FILL, layer_times = None, serial_times = None):
+    ## Returns the (NUM_CATEGORY_MASKS, NUM_UPPER_SCORES) table of expected final scores from the start of a turn.
+    ## With workers > 1, the score tables of each layer are split across a process pool that shares the
+    ## value table through shared memory, and every layer waits for the whole previous layer to be done.
+    ## With a checkpoint path, the value table is saved after every layer; resume = True skips the saved layers.
+    ## Only the layers of up to n_layers available categories are solved (the others are left at 0).
+    ## The wall time of every solved layer is appended to the list layer_times if given; serial_times, the
+    ## layer_times of a serial run, are used to report the speedup of every layer.
+    start_time = time.perf_counter()
+    masks = np.arange(NUM_CATEGORY_MASKS)
+    n_available = np.array([bin(mask).count('1') for mask in masks])
+
+    table_memory = shared_memory.SharedMemory(create = True, size = NUM_CATEGORY_MASKS * NUM_UPPER_SCORES * 8)
+    pool = None
+    try:
+        value_table = np.ndarray((NUM_CATEGORY_MASKS, NUM_UPPER_SCORES), dtype = np.float64, buffer = table_memory.buf)
+        value_table[:] = 0
+
+        n_layers_done = 0
+        saved = SolverProgress.load_checkpoint(checkpoint) if resume and checkpoint is not None else None
+        if saved is not None:
+            if saved['value_table'].shape != value_table.shape:
+                raise Exception(f"Checkpoint {checkpoint} does not hold a {RULESET} value table.")
+            value_table[:] = saved['value_table']
+            n_layers_done = int(saved['layers_done'])
+            if verbose:
+                print(f"Resuming after {n_layers_done} layers")
+
+        ## Progress counts turn-start states, i.e. (score table, upper score) pairs
+        n_states_done = np.count_nonzero((n_available >= 1) & (n_available <= n_layers_done)) * NUM_UPPER_SCORES
+        progress = SolverProgress.ProgressReport("full game", (NUM_CATEGORY_MASKS - 1) * NUM_UPPER_SCORES)
+        progress.start(n_states_done)
+
+        if workers > 1:
+            pool = ProcessPoolExecutor(workers, initializer = _attach_value_table, initargs = (table_memory.name,))
+
+        for n in range(n_layers_done + 1, n_layers + 1):
+            layer_start_time = time.perf_counter()
+            layer = masks[n_available == n]
+            if pool is None:
+                _solve_score_tables(layer, value_table)
+            else:
+                chunks = np.array_split(layer, min(len(layer), workers * CHUNKS_PER_WORKER))
+                list(pool.map(_solve_score_tables, chunks))
+            layer_time = time.perf_counter() - layer_start_time
+            if layer_times is not None:
+                layer_times.append(layer_time)
+            n_states_done += len(layer) * NUM_UPPER_SCORES
+            if verbose:
+                speedup = f", speedup {serial_times[n - 1] / layer_time:.2f}x" if serial_times is not None else ""
+                print(f"Layer {n} categories left: {len(layer)} score tables in {layer_time:.2f}s"
+                      f" ({workers} workers{speedup})")
+                progress.update(n_states_done, f"{n}/{NUM_CATEGORIES_TO_FILL}", force = True)
+            if checkpoint is not None:
+                SolverProgress.save_checkpoint(checkpoint, value_table = value_table, layers_done = n)
+
+        value_table = value_table.copy()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        table_memory.close()
+        table_memory.unlink()
+
+    if verbose:
+        print(f"Time taken = {time.perf_counter() - start_time}")
+        print(f"Expected score = {value_table[ALL_CATEGORIES_MASK, 0]}")
+    return value_table
+
+
+CHUNKS_PER_WORKER = 4  # chunks of a layer given to each worker, to even out their load
+_worker_memory = None
+_worker_value_table = None
+
+
+def _attach_value_table(name):
+    ## Process pool initializer: maps the value table shared by solve_full_game.
+    ## BLAS is limited to one thread per worker, so that workers do not compete for the cores with BLAS threads
+    ## (without threadpoolctl, numpy is already loaded here: set OPENBLAS_NUM_THREADS=1 before starting the solver).
+    global _worker_memory, _worker_value_table
+    if threadpool_limits is not None:
+        threadpool_limits(1)
+    _worker_memory = shared_memory.SharedMemory(name = name)
+    _worker_value_table = np.ndarray((NUM_CATEGORY_MASKS, NUM_UPPER_SCORES), dtype = np.float64, buffer = _worker_memory.buf)
+
+
+def _solve_score_tables(masks, value_table = None):
+    ## Solves the given score tables in place
+    if value_table is None:
+        value_table = _worker_value_table
+    for available_mask in masks:
+        value_table[available_mask] = solve_score_table(value_table, available_mask)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Solves the full game of Yahtzee.py for optimal solitaire play.")
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = "number of solver processes")
+    parser.add_argument('--output', default = VALUE_TABLE_FILE, help = "file to save the value table to")
+    parser.add_argument('--checkpoint', default = None, help = "file to save the partially solved table to after every layer")
+    parser.add_argument('--resume', action = 'store_true', help = "continue from the checkpoint file if it exists")
+    parser.add_argument('--speedup', action = 'store_true', help = "solve serially first, to report the speedup of every layer")
+    args = parser.parse_args()
+
+    serial_times = None
+    if args.speedup:
+        serial_times = []
+        solve_full_game(1, verbose = False, layer_times = serial_times)
+    value_table = solve_full_game(args.workers, checkpoint = args.checkpoint, resume = args.resume, serial_times = serial_times)
+    ValueTable.save_value_table(args.output, value_table, RULESET)
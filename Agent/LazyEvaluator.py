@@ -0,0 +1,155 @@
+from Yahtzee import DICE_COMBINATIONS, NUM_DICE_COMBINATIONS, dice_index
+from DiceTransitions import NUM_KEEPS, KEEP_ALL, FIRST_ROLL, keep_roll_probabilities, roll_keeps
+from collections import OrderedDict
+from typing import List
+import sys
+import Yahtzee_7
+import numpy as np
+
+## Top-down evaluator of the 7-category game of Yahtzee_7.py, for positions that do not need the whole state space.
+##
+## Values are computed on demand by recursion over the same states as ValueIterationAgent:
+##   roll state (filled categories, rerolls left, dice): best of scoring a category or holding a keep and rerolling
+##   keep state (filled categories, rerolls left after the reroll, keep): expectation over the rolls of the keep
+##   turn state (filled categories): expectation over the first roll of a turn
+## Only the score tables reachable from the queried position are visited, and every value is memoized
+## in a bounded LRU cache, keyed by an integer code of the state.
+
+N_CATEGORIES = Yahtzee_7.NUM_CATEGORIES
+N_REROLLS = 3  # number of rerolls left ranges from 0 to 2
+CACHE_SIZE = 1 << 20  # default number of memoized values
+
+## REWARD_TABLE[dice index, category] = score of writing the dice in the category, with the rules of Yahtzee_7.py
+REWARD_TABLE = np.array([
+    [Yahtzee_7.CATEGORIES_SCORING[category](dice) if Yahtzee_7.CATEGORIES_CHECK[category](dice) else 0
+     for category in range(N_CATEGORIES)]
+    for dice in map(np.array, DICE_COMBINATIONS)
+])
+
+## Integer codes of the three kinds of states, in disjoint ranges
+_N_ROLL_STATES = 2 ** N_CATEGORIES * N_REROLLS * NUM_DICE_COMBINATIONS
+_N_KEEP_STATES = 2 ** N_CATEGORIES * (N_REROLLS - 1) * NUM_KEEPS
+_KEEP_OFFSET = _N_ROLL_STATES
+_TURN_OFFSET = _N_ROLL_STATES + _N_KEEP_STATES
+
+_KEEP_ALL = KEEP_ALL.tolist()
+_FIRST_ROLL = FIRST_ROLL.tolist()
+
+
+class LazyEvaluator:
+    def __init__(self, cache_size = CACHE_SIZE, reward_table = REWARD_TABLE):
+        """
+        cache_size bounds the number of memoized values (least recently used ones are evicted first).
+        A cache smaller than the states reachable from a query makes the evaluator recompute evicted values,
+        which gets exponentially slow: it trades time for memory.
+        reward_table (252 x 7) defaults to the rules of Yahtzee_7.py.
+        """
+        self.cache_size = cache_size
+        self.rewards = reward_table.tolist()
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def value(self, dice: List[int], filled_categories: List[int], rerolls: int = 2) -> float:
+        """
+        Returns the optimal expected score still to be made from a position, given by its dice (in any order),
+        the indices of the categories already written, and the number of rerolls left in the turn.
+        """
+        filled_mask = 0
+        for category in filled_categories:
+            filled_mask |= 1 << category
+        return self._roll_value(filled_mask, rerolls, dice_index(dice))
+
+    def value_of_game(self, game: Yahtzee_7.Yahtzee) -> float:
+        """
+        Returns the optimal expected score still to be made from the current position of a game.
+        """
+        filled = np.nonzero(game.get_scoresheet() != Yahtzee_7.EMPTY)[0].tolist()
+        if len(filled) == N_CATEGORIES:
+            return 0.0
+        return self.value(game.get_dice(), filled, game.get_rerolls())
+
+    def cache_info(self):
+        """
+        Returns the cache statistics: hits, misses, hit rate, number of entries, and an estimate of its memory use.
+        """
+        lookups = self.hits + self.misses
+        memory = sys.getsizeof(self.cache) + sum(sys.getsizeof(code) + sys.getsizeof(value)
+                                                 for code, value in self.cache.items())
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'entries': len(self.cache),
+            'cache_size': self.cache_size,
+            'memory_bytes': memory,
+        }
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, code):
+        value = self.cache.get(code)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.cache.move_to_end(code)
+        return value
+
+    def _store(self, code, value):
+        self.cache[code] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+        return value
+
+    def _turn_value(self, filled_mask):
+        if filled_mask == 2 ** N_CATEGORIES - 1:
+            return 0.0
+        code = _TURN_OFFSET + filled_mask
+        value = self._lookup(code)
+        if value is not None:
+            return value
+        value = sum(probability * self._roll_value(filled_mask, N_REROLLS - 1, roll)
+                    for roll, probability in enumerate(_FIRST_ROLL))
+        return self._store(code, value)
+
+    def _roll_value(self, filled_mask, rerolls, roll):
+        code = (filled_mask * N_REROLLS + rerolls) * NUM_DICE_COMBINATIONS + roll
+        value = self._lookup(code)
+        if value is not None:
+            return value
+
+        rewards = self.rewards[roll]
+        value = max(rewards[category] + self._turn_value(filled_mask | 1 << category)
+                    for category in range(N_CATEGORIES) if not filled_mask >> category & 1)
+        if rerolls > 0:
+            for keep in roll_keeps(roll).tolist():
+                if keep != _KEEP_ALL[roll]:
+                    value = max(value, self._keep_value(filled_mask, rerolls - 1, keep))
+        return self._store(code, value)
+
+    def _keep_value(self, filled_mask, rerolls, keep):
+        code = _KEEP_OFFSET + (filled_mask * (N_REROLLS - 1) + rerolls) * NUM_KEEPS + keep
+        value = self._lookup(code)
+        if value is not None:
+            return value
+        rolls, probabilities = keep_roll_probabilities(keep)
+        value = sum(probability * self._roll_value(filled_mask, rerolls, roll)
+                    for roll, probability in zip(rolls.tolist(), probabilities.tolist()))
+        return self._store(code, value)
+
+
+if __name__ == '__main__':
+    import time
+
+    ## Late-game position of Yahtzee_7.py: Four-of-a-Kind, Full House and Yahtzee left
+    game = Yahtzee_7.Yahtzee(True)
+    game.set_state([1, 1, 1, 1, 6], [0, 3, 4, 6])
+    evaluator = LazyEvaluator()
+    start_time = time.perf_counter()
+    print(f"Value = {evaluator.value_of_game(game)}")
+    print(f"Time taken = {time.perf_counter() - start_time}")
+    print(evaluator.cache_info())
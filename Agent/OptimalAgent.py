@@ -0,0 +1,60 @@
+from Agent import Agent
+from Yahtzee import Yahtzee, NUM_DICE, BONUS_THRESHOLD, dice_index
+from FullGameSolver import (
+    NUM_CATEGORIES_TO_FILL,
+    RULESET,
+    VALUE_TABLE_FILE,
+    turn_values,
+    category_values,
+    solve_full_game,
+)
+from DiceTransitions import KEEPS, roll_keeps, keep_mask
+import ValueTable
+from typing import List, Literal, Tuple, Union
+import numpy as np
+
+
+class OptimalAgent(Agent):
+    def __init__(self, game : Yahtzee, value_table, rounds = NUM_CATEGORIES_TO_FILL, *args, **kwargs):
+        super().__init__(game, rounds, *args, **kwargs)
+        self.value_table = value_table
+
+    def get_agent_name(self):
+        return "Optimal Agent"
+
+    def get_action(
+        self,
+        dice: List[int],
+        rerolls: int,
+        available_categories: List[str]
+    ) -> Tuple[Literal['REROLL', 'KEEP'], Union[List[bool], int]]:
+        available_mask = self.game.get_available_mask()
+        upper_score = [min(self.game.get_upper_score(), BONUS_THRESHOLD)]
+        r = dice_index(dice)
+
+        if rerolls == 0:
+            values = category_values(self.value_table, available_mask, upper_score)
+            return ('KEEP', int(np.argmax(values[:, r, 0])))
+
+        roll_values, keep_values = turn_values(self.value_table, available_mask, upper_score)
+        choices = roll_keeps(r)
+        kept = KEEPS[choices[np.argmax(keep_values[rerolls - 1][choices, 0])]]
+        if len(kept) == NUM_DICE:
+            values = category_values(self.value_table, available_mask, upper_score)
+            return ('KEEP', int(np.argmax(values[:, r, 0])))
+        return ('REROLL', keep_mask(dice, kept))
+
+
+if __name__ == '__main__':
+    import os
+
+    if not os.path.exists(VALUE_TABLE_FILE):
+        ValueTable.save_value_table(VALUE_TABLE_FILE, solve_full_game(), RULESET)
+    value_table = ValueTable.load_value_table(VALUE_TABLE_FILE, RULESET)
+
+    scores = []
+    for _ in range(100):
+        agent = OptimalAgent(Yahtzee(log_mode = 'none'), value_table)
+        scores.append(agent.play_game())
+    print(f"Mean: {np.mean(scores)}")
+    print(f"Std Dev: {np.std(scores)}")
@@ -0,0 +1,75 @@
+from Agent import Agent
+from ValueIterationAgent import (
+    N_CATEGORIES,
+    N_REROLLS,
+    N_DICE_COMBINATIONS,
+    RULESET,
+    POLICY_FILE,
+    SCORE_ACTION,
+    decode_policy_action,
+    encode_state,
+)
+from DiceTransitions import KEEPS, keep_mask
+from Yahtzee import DICE_INDEX
+import ValueTable
+from itertools import product
+from typing import List, Literal, Tuple, Union
+import Yahtzee_7
+import numpy as np
+
+## Dice index of every ordered roll, keyed by the bytes of the game's uint8 dice, so that decisions need not sort the dice
+ROLL_INDEX = {bytes(roll): DICE_INDEX[tuple(sorted(roll))]
+              for roll in product(Yahtzee_7.DIE_CHOICES, repeat = Yahtzee_7.NUM_DICE)}
+
+
+class PolicyAgent(Agent):
+    ## Plays the 7-category game from a policy table extracted by ValueIterationAgent.save_policy:
+    ## every decision is a single lookup in the table, no expectation is computed while playing.
+    def __init__(self, game : Yahtzee_7.Yahtzee, policy = None, rounds = N_CATEGORIES, *args, **kwargs):
+        super().__init__(game, rounds, *args, **kwargs)
+        self.policy = ValueTable.load_value_table(POLICY_FILE, RULESET) if policy is None else policy
+
+    def get_agent_name(self):
+        return "Policy Agent"
+
+    def get_action(
+        self,
+        dice: List[int],
+        rerolls: int,
+        available_categories: List[str]
+    ) -> Tuple[Literal['REROLL', 'KEEP'], Union[List[bool], int]]:
+        ## encode_state of the state, with the score table bits kept up to date by the game
+        dice_idx = ROLL_INDEX.get(dice.tobytes()) if type(dice) == np.ndarray else None
+        if dice_idx is None:  # dice given as a list, or not as uint8
+            dice_idx = DICE_INDEX[tuple(sorted(int(die) for die in dice))]
+        action = int(self.policy[(self.game.filled_mask * N_REROLLS + rerolls) * N_DICE_COMBINATIONS + dice_idx])
+        if action >= SCORE_ACTION:
+            return ('KEEP', action - SCORE_ACTION)
+        dice = dice.tolist() if type(dice) == np.ndarray else list(dice)
+        return ('REROLL', keep_mask(dice, KEEPS[action]))
+
+    def get_action_from_state(self, state):
+        ## Same action format as ValueIterationAgent.get_action_from_state
+        return decode_policy_action(state, self.policy[encode_state(state)])
+
+
+if __name__ == '__main__':
+    import os
+    import time
+    from ValueIterationAgent import ValueIterationAgent, VALUE_TABLE_FILE
+
+    if not os.path.exists(POLICY_FILE):
+        agent = ValueIterationAgent(Yahtzee_7.Yahtzee())
+        if os.path.exists(VALUE_TABLE_FILE):
+            agent.save_policy()
+        else:
+            agent.run_vectorized_backup(save_to_file = True)
+
+    scores = []
+    start_time = time.perf_counter()
+    for _ in range(1000):
+        agent = PolicyAgent(Yahtzee_7.Yahtzee())
+        scores.append(agent.play_game())
+    print(f"Time per game = {(time.perf_counter() - start_time) / 1000 * 1e3:.3f}ms")
+    print(f"Mean: {np.mean(scores)}")
+    print(f"Std Dev: {np.std(scores)}")
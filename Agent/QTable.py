@@ -0,0 +1,304 @@
+from Yahtzee import NUM_CATEGORIES, NUM_REROLL_STATES, NUM_DICE_COMBINATIONS, dice_index
+from DiceTransitions import KEEPS, KEEP_INDEX, KEEP_ALL, ROLL_KEEP_INDPTR, roll_keeps, keep_mask
+from SolverProgress import save_checkpoint, load_checkpoint
+from functools import lru_cache
+import numpy as np
+
+## Array-backed Q-table for the Q-learning agents of the full game.
+##
+## States of Yahtzee.getCurrentState() (dice, rerolls, available categories) are encoded as one int.
+## Rerolls are canonical: an action keeps a multiset of the dice, whatever their positions, so states only
+## depend on the multiset of their dice too:
+##   code = (available mask * NUM_REROLL_STATES + rerolls) * NUM_DICE_COMBINATIONS + dice index
+## Actions get an id given the dice they apply to:
+##   0 to N_REROLL_ACTIONS - 1: ('REROLL', mask), the position of the kept multiset among the keeps of
+##     the dice (DiceTransitions.roll_keeps), so that masks keeping the same faces share an id
+##   KEEP_ACTION + c: ('KEEP', c)
+##
+## The visited states are a sparse subset of the codes: an open-addressing hash (linear probing) maps
+## each visited state code to a row of a preallocated (rows, N_ACTIONS) array of Q-values.
+## Both grow by doubling when full, so reads and writes do not allocate otherwise.
+##
+## Every row also caches its best (max Q-value, first action id with it) over the legal actions, which only
+## the caller knows: the cache is filled by set_best() after a scan of the legal actions, then kept up to date
+## by set(), which must only write legal actions. Writes lowering the current max clear the cache (NO_ACTION),
+## so the next read rescans.
+
+N_REROLL_ACTIONS = int(np.diff(ROLL_KEEP_INDPTR).max())  # = 32, the keeps of five distinct dice
+KEEP_ACTION = N_REROLL_ACTIONS
+N_ACTIONS = KEEP_ACTION + NUM_CATEGORIES - 1
+
+## ROLL_KEEP_IDS[dice index][keep] = action id of rerolling the dice while holding the keep
+ROLL_KEEP_IDS = [{keep: action_id for action_id, keep in enumerate(roll_keeps(roll).tolist())}
+                 for roll in range(NUM_DICE_COMBINATIONS)]
+
+EMPTY_KEY = -1
+NO_ACTION = -1  # best action of a row whose best is not cached
+INITIAL_ROWS = 1 << 12
+MAX_LOAD = 0.5  # maximum ratio of used hash slots before the hash is doubled
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing: spreads the regularly spaced state codes over the slots
+ACTION_CACHE_SIZE = 1 << 16
+
+
+def encode_state(state):
+    """
+    Encodes a state (dice, rerolls, available categories) of Yahtzee.getCurrentState() as an int.
+    """
+    dice, rerolls, available_categories = state
+    available_mask = 0
+    for category in available_categories:
+        available_mask |= 1 << category
+    return (available_mask * NUM_REROLL_STATES + rerolls) * NUM_DICE_COMBINATIONS + dice_index(dice)
+
+
+def encode_action(action, dice):
+    """
+    Returns the id (0 to N_ACTIONS - 1) of a ('REROLL', mask) or ('KEEP', category) action on the given dice.
+    Masks may be longer than the dice: extra entries are ignored, as in Yahtzee.roll_dice().
+    """
+    kind, choice = action
+    if kind == 'KEEP':
+        return KEEP_ACTION + choice
+    return _reroll_action_id(tuple(dice), tuple(choice))
+
+
+@lru_cache(maxsize=ACTION_CACHE_SIZE)
+def _reroll_action_id(dice, mask):
+    kept = tuple(sorted(die for die, keep in zip(dice, mask) if keep))
+    return ROLL_KEEP_IDS[dice_index(dice)][KEEP_INDEX[kept]]
+
+
+def decode_action(action_id, dice):
+    """
+    Inverse of encode_action(): rerolls are returned as the canonical mask of reroll_actions().
+    """
+    if action_id >= KEEP_ACTION:
+        return ('KEEP', action_id - KEEP_ACTION)
+    keep = roll_keeps(dice_index(dice))[action_id]
+    return ('REROLL', tuple(keep_mask(dice, KEEPS[keep])))
+
+
+@lru_cache(maxsize=None)
+def reroll_actions(dice):
+    """
+    Returns one ('REROLL', mask) action per distinct multiset of dice that can be kept, in action id order.
+    Keeping every die is left out, since it only wastes a reroll.
+    dice must be a tuple (the dice of a state), and at most 6 ** 5 orders of the dice are cached.
+    """
+    roll = dice_index(dice)
+    return [('REROLL', tuple(keep_mask(dice, KEEPS[keep]))) for keep in roll_keeps(roll).tolist() if keep != KEEP_ALL[roll]]
+
+
+class QTable:
+
+    def __init__(self, rows: int = INITIAL_ROWS, n_actions: int = N_ACTIONS, dtype = np.float64):
+        """
+        Preallocates Q-values for the given number of states (rows), grown by doubling when needed.
+        """
+        self.n_actions = n_actions
+        self.values = np.zeros((rows, n_actions), dtype=dtype)
+        self.best_values = np.zeros(rows, dtype=dtype)
+        self.best_actions = np.full(rows, NO_ACTION, dtype=np.int64)
+        self.n_rows = 0
+        self.hash_bits = 1
+        while 2 ** self.hash_bits * MAX_LOAD < rows:
+            self.hash_bits += 1
+        self.keys = np.full(2 ** self.hash_bits, EMPTY_KEY, dtype=np.int64)
+        self.slot_rows = np.zeros(len(self.keys), dtype=np.int64)
+
+    def __len__(self):
+        """
+        Returns the number of states visited (i.e. with a row of Q-values).
+        """
+        return self.n_rows
+
+    def find(self, state_code: int) -> int:
+        """
+        Returns the row of Q-values of a state, or -1 if the state was never written.
+        """
+        mask = len(self.keys) - 1
+        slot = self._slot(state_code)
+        while True:
+            key = self.keys[slot]
+            if key == state_code:
+                return int(self.slot_rows[slot])
+            if key == EMPTY_KEY:
+                return -1
+            slot = (slot + 1) & mask
+
+    def insert(self, state_code: int) -> int:
+        """
+        Returns the row of Q-values of a state, allocating a zeroed row if the state was never written.
+        """
+        mask = len(self.keys) - 1
+        slot = self._slot(state_code)
+        while True:
+            key = self.keys[slot]
+            if key == state_code:
+                return int(self.slot_rows[slot])
+            if key == EMPTY_KEY:
+                break
+            slot = (slot + 1) & mask
+
+        if self.n_rows == len(self.values):
+            self._grow_rows()
+        row = self.n_rows
+        self.n_rows += 1
+        self.keys[slot] = state_code
+        self.slot_rows[slot] = row
+        if self.n_rows > len(self.keys) * MAX_LOAD:
+            self._grow_hash()
+        return row
+
+    def find_many(self, state_codes):
+        """
+        Vectorized find(): returns the rows of an array of state codes, -1 for states never written.
+        """
+        state_codes = np.asarray(state_codes, dtype=np.int64)
+        unique_codes, inverse = np.unique(state_codes, return_inverse=True)
+        slots = self._probe(unique_codes)
+        rows = np.where(self.keys[slots] == unique_codes, self.slot_rows[slots], -1)
+        return rows[inverse].reshape(state_codes.shape)
+
+    def insert_many(self, state_codes):
+        """
+        Vectorized insert(): returns the rows of an array of state codes, allocating zeroed rows for new states
+        (in the order of their codes).
+        """
+        state_codes = np.asarray(state_codes, dtype=np.int64)
+        unique_codes, inverse = np.unique(state_codes, return_inverse=True)
+        new_codes = unique_codes[self.keys[self._probe(unique_codes)] != unique_codes]
+        if len(new_codes):
+            n_rows = self.n_rows + len(new_codes)
+            while n_rows > len(self.values):
+                self._grow_rows()
+            while n_rows > len(self.keys) * MAX_LOAD:
+                self._grow_hash()
+            self._place(new_codes, np.arange(self.n_rows, n_rows))
+            self.n_rows = n_rows
+        return self.find_many(unique_codes)[inverse].reshape(state_codes.shape)
+
+    def get(self, state_code: int, action_id: int) -> float:
+        """
+        Returns Q(state, action), 0.0 if the state was never written.
+        """
+        row = self.find(state_code)
+        if row < 0:
+            return 0.0
+        return float(self.values[row, action_id])
+
+    def set(self, state_code: int, action_id: int, value: float):
+        row = self.insert(state_code)  # before reading self.values, which insert() may grow
+        self.values[row, action_id] = value
+
+        best_action = self.best_actions[row]
+        if best_action == NO_ACTION:
+            return
+        best_value = self.best_values[row]
+        if value > best_value or (value == best_value and action_id < best_action):
+            self.best_values[row] = value
+            self.best_actions[row] = action_id
+        elif action_id == best_action and value < best_value:
+            ## Another action may now be the best: rescan on the next read
+            self.best_actions[row] = NO_ACTION
+
+    def get_best(self, row: int):
+        """
+        Returns the cached (max Q-value, action id) of a row, or None if it is not cached.
+        """
+        best_action = int(self.best_actions[row])
+        if best_action == NO_ACTION:
+            return None
+        return float(self.best_values[row]), best_action
+
+    def set_best(self, row: int, value: float, action_id: int):
+        """
+        Caches the (max Q-value, first action id with it) of a row, scanned over its legal actions.
+        """
+        self.best_values[row] = value
+        self.best_actions[row] = action_id
+
+    def clear_best(self, rows):
+        """
+        Clears the cached best of rows written without set().
+        """
+        self.best_actions[rows] = NO_ACTION
+
+    def row_values(self, state_code: int):
+        """
+        Returns the Q-values of every action of a state (read-only, zeros if the state was never written).
+        """
+        row = self.find(state_code)
+        if row < 0:
+            return np.zeros(self.n_actions, dtype=self.values.dtype)
+        return self.values[row]
+
+    def save(self, path: str):
+        """
+        Atomically saves the Q-values and the hash of the visited states to a .npz file.
+        Cached bests are not saved: a loaded table rescans them.
+        """
+        save_checkpoint(path, values=self.values[:self.n_rows], keys=self.keys, slot_rows=self.slot_rows)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Returns the QTable saved to path by save(), or None if there is no file at path.
+        """
+        checkpoint = load_checkpoint(path)
+        if checkpoint is None:
+            return None
+        values = checkpoint['values']
+        table = cls(rows=max(INITIAL_ROWS, int(len(checkpoint['keys']) * MAX_LOAD)), n_actions=values.shape[1], dtype=values.dtype)
+        table.values[:len(values)] = values
+        table.n_rows = len(values)
+        table.keys = checkpoint['keys']
+        table.slot_rows = checkpoint['slot_rows']
+        table.hash_bits = len(table.keys).bit_length() - 1
+        return table
+
+    def nbytes(self) -> int:
+        return (self.values.nbytes + self.best_values.nbytes + self.best_actions.nbytes
+                + self.keys.nbytes + self.slot_rows.nbytes)
+
+    def _slot(self, state_code: int) -> int:
+        ## Top bits of the 64-bit product, as many as needed to index the slots
+        return ((state_code * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.hash_bits)
+
+    def _grow_rows(self):
+        self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+        self.best_values = np.concatenate([self.best_values, np.zeros_like(self.best_values)])
+        self.best_actions = np.concatenate([self.best_actions, np.full_like(self.best_actions, NO_ACTION)])
+
+    def _grow_hash(self):
+        used = self.keys != EMPTY_KEY
+        codes, rows = self.keys[used], self.slot_rows[used]
+        self.hash_bits += 1
+        self.keys = np.full(2 ** self.hash_bits, EMPTY_KEY, dtype=np.int64)
+        self.slot_rows = np.zeros(len(self.keys), dtype=np.int64)
+        self._place(codes, rows)
+
+    def _slots(self, state_codes):
+        ## Vectorized _slot(): uint64 products wrap around like the masked product of _slot()
+        return ((state_codes.astype(np.uint64) * np.uint64(HASH_MULTIPLIER)) >> np.uint64(64 - self.hash_bits)).astype(np.int64)
+
+    def _probe(self, state_codes):
+        ## Slot of every state code (distinct codes), or the first empty slot of its probe sequence if it is absent
+        mask = len(self.keys) - 1
+        slots = self._slots(state_codes)
+        pending = np.arange(len(state_codes))
+        while len(pending):
+            keys = self.keys[slots[pending]]
+            pending = pending[(keys != state_codes[pending]) & (keys != EMPTY_KEY)]
+            slots[pending] = (slots[pending] + 1) & mask
+        return slots
+
+    def _place(self, state_codes, rows):
+        ## Writes absent state codes into the hash: codes probing to the same empty slot take turns
+        while len(state_codes):
+            slots, first = np.unique(self._probe(state_codes), return_index=True)
+            self.keys[slots] = state_codes[first]
+            self.slot_rows[slots] = rows[first]
+            rest = np.ones(len(state_codes), dtype=bool)
+            rest[first] = False
+            state_codes, rows = state_codes[rest], rows[rest]
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+## Progress reports and checkpoints for long solver runs.
+##
+## Progress is printed as one line of key=value fields, so that logs of a run can be grepped or parsed:
+##   [solver] layer=4/13 states=139264/524224 states_per_s=5120.3 elapsed_s=27.2 eta_s=75.2 peak_rss_mb=210.5
+## Checkpoints are .npz files of named arrays, written to a temporary file first and then renamed,
+## so that an interrupted write never leaves a truncated checkpoint behind.
+
+PROGRESS_INTERVAL = 10  # seconds between progress lines
+CHECKPOINT_INTERVAL = 60  # seconds between checkpoints
+
+
+def peak_rss_mb():
+    ## Peak resident set size of this process and of its (waited for) children, in MB, or None if unknown
+    if resource is None:
+        return None
+    ## ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) * unit / 2 ** 20
+
+
+class ProgressReport:
+    def __init__(self, name, total_states, interval = PROGRESS_INTERVAL, stream = None):
+        self.name = name
+        self.total_states = total_states
+        self.interval = interval
+        self.stream = stream
+        self.start_time = time.perf_counter()
+        self.last_report_time = self.start_time
+        self.start_states = None
+
+    def update(self, done_states, layer, force = False, **fields):
+        """
+        Prints a progress line if the report interval has elapsed since the last one, or if force is set.
+        done_states counts the states solved since the start of the solve, including resumed ones:
+        only the states solved by this run count towards the rate.
+        Extra keyword arguments are appended as additional fields.
+        """
+        now = time.perf_counter()
+        if self.start_states is None:
+            self.start_states = done_states
+        if not force and now - self.last_report_time < self.interval:
+            return
+        self.last_report_time = now
+
+        elapsed = now - self.start_time
+        rate = (done_states - self.start_states) / elapsed if elapsed > 0 else 0
+        eta = (self.total_states - done_states) / rate if rate > 0 else float('inf')
+        rss = peak_rss_mb()
+        line = (f"[{self.name}] layer={layer} states={done_states}/{self.total_states} states_per_s={rate:.1f}"
+                f" elapsed_s={elapsed:.1f} eta_s={eta:.1f}"
+                f" peak_rss_mb={'unknown' if rss is None else f'{rss:.1f}'}")
+        for key, value in fields.items():
+            line += f" {key}={value}"
+        print(line, file = self.stream or sys.stdout, flush = True)
+
+    def start(self, done_states):
+        ## Sets the number of states already solved when the run starts (e.g. when resuming)
+        self.start_states = done_states
+
+
+def save_checkpoint(path, **arrays):
+    """
+    Atomically saves the given arrays (and scalars) to a .npz checkpoint.
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as checkpoint_file:
+        np.savez(checkpoint_file, **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path):
+    """
+    Returns the arrays of a checkpoint as a dict, or None if there is no checkpoint at path.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as checkpoint:
+        return {key: checkpoint[key] for key in checkpoint.files}
@@ -1,80 +1,261 @@
 from Agent import Agent
-from Yahtzee import Yahtzee
+from Yahtzee import Yahtzee, DICE_COMBINATIONS, DICE_INDEX
 import Yahtzee
+import DiceTransitions
+import ValueTable
+import SolverProgress
 import itertools
-from pprint import pprint
 import random
 from functools import cache
 import time
 import numpy as np
 
 
+N_CATEGORIES = 7
+N_REROLLS = 3  # number of rerolls left ranges from 0 to 2
+N_DICE_COMBINATIONS = len(DICE_COMBINATIONS)
+N_STATES = 2 ** N_CATEGORIES * N_REROLLS * N_DICE_COMBINATIONS
+RULESET = 'yahtzee7'
+VALUE_TABLE_FILE = 'value_table.bin'
+POLICY_FILE = 'policy_table.bin'
+
+## Policy table actions (uint16, indexed by encode_state):
+##   0 to NUM_KEEPS - 1: reroll, holding the dice DiceTransitions.KEEPS[action]
+##   SCORE_ACTION + idx: keep the dice and assign them to the (0-based) column idx
+##   NO_ACTION: all categories are filled
+SCORE_ACTION = DiceTransitions.NUM_KEEPS
+NO_ACTION = np.iinfo(np.uint16).max
+
+
+def encode_state(state):
+    ## Index of a state in dense tables: ((score table bits) * N_REROLLS + n_rerolls_left) * 252 + dice index
+    dice_values, score_table, n_rerolls_left = state
+    table_index = 0
+    for idx, is_filled in enumerate(score_table):
+        table_index |= is_filled << idx
+    return (table_index * N_REROLLS + n_rerolls_left) * N_DICE_COMBINATIONS + DICE_INDEX[dice_values]
+
+def decode_state(code):
+    ## Inverse of encode_state
+    table_and_rerolls, dice_idx = divmod(code, N_DICE_COMBINATIONS)
+    table_index, n_rerolls_left = divmod(table_and_rerolls, N_REROLLS)
+    score_table = tuple(table_index >> idx & 1 for idx in range(N_CATEGORIES))
+    return (DICE_COMBINATIONS[dice_idx], score_table, n_rerolls_left)
+
+def state_range(table_index, n_rerolls_left):
+    ## Codes of the states with a score table and a number of rerolls left: a contiguous range, one per dice combination
+    start = (table_index * N_REROLLS + n_rerolls_left) * N_DICE_COMBINATIONS
+    return range(start, start + N_DICE_COMBINATIONS)
+
+## Number of filled categories of each score table, indexed by its bits
+N_FILLED = [bin(table_index).count('1') for table_index in range(2 ** N_CATEGORIES)]
+
+
 class ValueIterationAgent(Agent):    
-    def __init__(self, yahtzee : Yahtzee, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, yahtzee : Yahtzee, rounds = 7, *args, **kwargs):
+        super().__init__(yahtzee, rounds, *args, **kwargs)
         self.yahtzee = yahtzee
+        self.utilities = None
 
     def get_agent_name(self):
         return "Value Iteration Agent"
     
-    def run_value_iteration(self, max_allowable_error, save_to_file = False):
+    def run_value_iteration(self, max_allowable_error, save_to_file = False, checkpoint = None, resume = False):
+        ## With a checkpoint path, the value table and the position in the sweep are saved every
+        ## CHECKPOINT_INTERVAL seconds and when interrupted (the interruption is then raised again, and nothing
+        ## is saved to file); resume = True continues from that checkpoint.
         start_time = time.perf_counter()
         n_iters = 0
+        self.value_table = np.zeros(N_STATES)
+        self.max_allowable_error = max_allowable_error
+
+        itr = 1
+        position = 0
+        delta = 0
+        if resume and checkpoint is not None:
+            saved = self.load_checkpoint(checkpoint, 'value_iteration')
+            if saved is not None:
+                itr, position, delta = int(saved['iteration']), int(saved['position']), float(saved['delta'])
+                print(f"Resuming iteration {itr} at state {position}")
+        progress = SolverProgress.ProgressReport("value iteration", N_STATES)
+        progress.start(position)
+        last_checkpoint_time = time.perf_counter()
+
         try:
-            self.value_table = {
-                state : 0 for state in generate_state_space()
-            }
-            self.max_allowable_error = max_allowable_error
-
-            delta = self.max_allowable_error + 1
-            itr = 1
-            while delta > self.max_allowable_error:
+            while True:
                 print(f"Iteration {itr}")
-                itr += 1
-                for s in self.value_table.keys():
-                    # print(f"State = {s}")
+                ## Sweeps states in encoded order, i.e. through the value table in memory order
+                for position in range(position, N_STATES):
                     n_iters += 1
-                    curr_state_value = self.value_table[s]
-                    
-                    actions = generate_actions(s)
-                    q_values = []
-                    for action in actions:
-                        action_q_value = sum((prob * (get_reward(s, action) + self.value_table[next_state]) for next_state, prob in get_transition_probabilities(s, action).items()))
-                        q_values.append(action_q_value)
-                    
-                    new_state_value = max(q_values) if q_values != [] else 0
-                    self.value_table[s] = new_state_value
+                    curr_state_value = self.value_table[position]
+                    new_state_value = bellman_backup(decode_state(position), self.value_table)
+                    self.value_table[position] = new_state_value
                     delta = max(delta, abs(curr_state_value - new_state_value))
+
+                    if n_iters % 1000 == 0:
+                        progress.update(position + 1, itr, delta = f"{delta:.6g}")
+                        if checkpoint is not None and time.perf_counter() - last_checkpoint_time > SolverProgress.CHECKPOINT_INTERVAL:
+                            self.save_checkpoint(checkpoint, 'value_iteration', iteration = itr, position = position + 1, delta = delta)
+                            last_checkpoint_time = time.perf_counter()
                 print(f"{delta = }")
                 print("----------------------")
-        except KeyboardInterrupt:
-            print(f"States processed =  {n_iters}")
+                if delta <= self.max_allowable_error:
+                    break
+                ## Next sweep
+                itr += 1
+                position = 0
+                delta = 0
+                progress = SolverProgress.ProgressReport("value iteration", N_STATES)
         except BaseException:
-            print("Exception thrown")
+            print(f"States processed =  {n_iters}")
+            if checkpoint is not None:
+                ## The state at position was not finished: it is redone on resume
+                self.save_checkpoint(checkpoint, 'value_iteration', iteration = itr, position = position, delta = delta)
+                print(f"Checkpoint saved to {checkpoint}")
+            raise
         finally:
             end_time = time.perf_counter()
             print(f"Time taken = {end_time - start_time}")
-
             print("Value iteration done")
-            
-            if save_to_file:
-                with open('value_table.txt', 'w') as output:
-                    pprint(self.value_table, sort_dicts= False, stream=output)
+
+        if save_to_file:
+            self.save_value_table()
+            self.save_policy()
+
+    def run_backward_induction(self, save_to_file = False, checkpoint = None, resume = False, min_filled = 0):
+        ## The state graph is acyclic: filled categories only grow, and rerolls only shrink within a round.
+        ## States are solved once each, layer by layer in reverse topological order:
+        ## most filled categories first, and within a score table, fewest rerolls left first.
+        ## With a checkpoint path, the value table is saved after every layer; resume = True skips the saved layers.
+        ## Only score tables with at least min_filled filled categories are solved, the others are left at 0.
+        start_time = time.perf_counter()
+        self.value_table = np.zeros(N_STATES)
+        layer_order = [(n_filled, n_rerolls_left) for n_filled in range(N_CATEGORIES, min_filled - 1, -1)
+                       for n_rerolls_left in range(N_REROLLS)]
+
+        n_layers_done = 0
+        if resume and checkpoint is not None:
+            saved = self.load_checkpoint(checkpoint, 'backward_induction')
+            if saved is not None:
+                n_layers_done = int(saved['layers_done'])
+                print(f"Resuming after {n_layers_done} layers")
+        n_states_done = sum(N_FILLED.count(n_filled) for n_filled, _ in layer_order[:n_layers_done]) * N_DICE_COMBINATIONS
+        progress = SolverProgress.ProgressReport("backward induction", N_STATES)
+        progress.start(n_states_done)
+
+        for layer_index in range(n_layers_done, len(layer_order)):
+            n_filled, n_rerolls_left = layer_order[layer_index]
+            layer_start_time = time.perf_counter()
+            layer = [code for table_index in range(2 ** N_CATEGORIES) if N_FILLED[table_index] == n_filled
+                     for code in state_range(table_index, n_rerolls_left)]
+            for code in layer:
+                self.value_table[code] = bellman_backup(decode_state(code), self.value_table)
+            layer_time = time.perf_counter() - layer_start_time
+            print(f"Layer {n_filled = }, {n_rerolls_left = }: {len(layer)} states in {layer_time:.2f}s")
+
+            n_states_done += len(layer)
+            progress.update(n_states_done, f"{layer_index + 1}/{len(layer_order)}", force = True)
+            if checkpoint is not None:
+                self.save_checkpoint(checkpoint, 'backward_induction', layers_done = layer_index + 1)
+
+        end_time = time.perf_counter()
+        print(f"Time taken = {end_time - start_time}")
+        print("Backward induction done")
+
+        if save_to_file:
+            self.save_value_table()
+            self.save_policy()
+
+    def run_vectorized_backup(self, save_to_file = False, min_filled = 0):
+        ## Same order as run_backward_induction, but all states of a score table are backed up at once:
+        ## the states of a table are contiguous in the value table, viewed as a (N_REROLLS, 252) array
+        ## indexed by [n_rerolls_left, dice index], and the Q-values of every action come from matrix
+        ## products with the dice transitions.
+        start_time = time.perf_counter()
+        self.value_table = np.zeros(N_STATES)
+        table_values = self.value_table.reshape(2 ** N_CATEGORIES, N_REROLLS, N_DICE_COMBINATIONS)
+
+        for n_filled in range(N_CATEGORIES, min_filled - 1, -1):
+            layer_start_time = time.perf_counter()
+            layer = [table_index for table_index in range(2 ** N_CATEGORIES) if N_FILLED[table_index] == n_filled]
+            for table_index in layer:
+                table_values[table_index] = self.backup_score_table(table_index)
+            layer_time = time.perf_counter() - layer_start_time
+            print(f"Layer {n_filled = }: {len(layer) * N_DICE_COMBINATIONS * N_REROLLS} states in {layer_time:.4f}s")
+
+        end_time = time.perf_counter()
+        print(f"Time taken = {end_time - start_time}")
+        print("Vectorized backup done")
+
+        if save_to_file:
+            self.save_value_table()
+            self.save_policy()
+
+    def backup_score_table(self, table_index):
+        ## Returns the (N_REROLLS, 252) values of every state with this score table (given by its bits).
+        ## Tables with one more filled category must already be solved in self.value_table.
+        table_values = self.value_table.reshape(2 ** N_CATEGORIES, N_REROLLS, N_DICE_COMBINATIONS)
+        values = np.zeros((N_REROLLS, N_DICE_COMBINATIONS))
+        unfilled = [idx for idx in range(N_CATEGORIES) if not table_index >> idx & 1]
+        if unfilled == []:
+            return values
+
+        values[0] = np.max(keep_q_values(table_values, table_index, unfilled), axis = 1)
+        for n_rerolls_left in range(1, N_REROLLS):
+            best_reroll_values = DiceTransitions.best_keep_values(reroll_q_values(values[n_rerolls_left - 1]))
+            values[n_rerolls_left] = np.maximum(values[0], best_reroll_values)
+        return values
+
+    def save_value_table(self, path = VALUE_TABLE_FILE):
+        ## Saves the value table as a dense float32 array indexed by encode_state (see ValueTable.py)
+        ValueTable.save_value_table(path, self.value_table, RULESET)
+        self.utilities = self.value_table
+
+    def save_policy(self, path = POLICY_FILE):
+        ## Saves the best action of every state (see extract_policy), next to the value table
+        if self.utilities is None:
+            self.load_utilities()
+        ValueTable.save_value_table(path, extract_policy(self.utilities), RULESET, dtype = np.uint16)
+
+    def save_checkpoint(self, path, kind, **progress):
+        ## Saves the partially solved value table (in full precision) with the given progress counters,
+        ## for the kind of solve ('value_iteration' or 'backward_induction') they belong to
+        SolverProgress.save_checkpoint(path, kind = kind, values = self.value_table, **progress)
+
+    def load_checkpoint(self, path, kind):
+        ## Restores the value table from a checkpoint of the given kind of solve,
+        ## returns its progress counters (None if there is no checkpoint)
+        saved = SolverProgress.load_checkpoint(path)
+        if saved is None:
+            return None
+        saved_kind = str(saved.pop('kind', 'unknown'))
+        if saved_kind != kind:
+            raise Exception(f"Checkpoint {path} is a {saved_kind} checkpoint, cannot resume {kind} from it.")
+        values = saved.pop('values')
+        if values.shape != (N_STATES,):
+            raise Exception(f"Checkpoint {path} does not hold a {RULESET} value table.")
+        self.value_table[:] = values
+        return saved
+
+    def load_utilities(self, path = VALUE_TABLE_FILE):
+        try:
+            self.utilities = ValueTable.load_value_table(path, RULESET)
+        except FileNotFoundError:
+            print("Utilities not defined. Run value iteration first.")
+            raise
     
     def get_action(self, *args):
         raise NotImplemented
 
     def get_action_from_state(self, state):
-        try:
-            from value_table import utilities
-        except ImportError:
-            print("Utilities not defined. Run value iteration first.")
-            raise ImportError
+        if self.utilities is None:
+            self.load_utilities()
+        utilities = self.utilities
 
         best_q_value = -1
         best_action = None
         for action in generate_actions(state):
-            action_q_value = sum((prob * (get_reward(state, action) + utilities[next_state]) for next_state, prob in get_transition_probabilities(state, action).items()))
+            action_q_value = sum((prob * (get_reward(state, action) + utilities[encode_state(next_state)]) for next_state, prob in get_transition_probabilities(state, action).items()))
             if action_q_value > best_q_value:
                 best_q_value = action_q_value
                 best_action = action
@@ -85,21 +266,8 @@ class ValueIterationAgent(Agent):
 ## Reduced_state should be a tuple of (score_table (2^13 values) , unordered_dice_rolls (252 values), n_rerolls_left)
 
 def generate_state_space():
-    dice_values = list(itertools.combinations_with_replacement((1,2,3,4,5,6), 5))
-    # for i in dice_values:
-    #     print(i)
-
-    # print(len(dice_values))
-
-    table_states = list(itertools.product((0,1), repeat = 7))
-    # print(table_states)
-    # print(len(table_states))
-
-    states = list(itertools.product(dice_values, table_states, (2,1,0)))
-    # print(len(states))
-    # print(states[-1])
-
-    return states
+    ## Lazily yields every state, in encoded order (see encode_state)
+    return (decode_state(code) for code in range(N_STATES))
 
 
 ## Given a unordered dice state, generate all possible rerolls
@@ -115,30 +283,18 @@ def generate_rerolls(dice_combination):
     
 # print(generate_rerolls((1, 5, 5, 5, 6)))
 
+@cache
 def get_reroll_probabilities(dice_combination, dice_to_reroll):
     kept_dice = list(dice_combination)
     for die in dice_to_reroll:
         kept_dice.remove(die)
     kept_dice = tuple(kept_dice)
-    
-    num_dice_to_reroll = len(dice_to_reroll)
-    reroll_results = itertools.product((1,2,3,4,5,6), repeat = num_dice_to_reroll)
-    
-    transition_counts = dict()
-    for result in reroll_results:
-        new_dice_combination = kept_dice + result
-        new_dice_combination = tuple(sorted(new_dice_combination))
 
-        if new_dice_combination not in transition_counts:
-            transition_counts[new_dice_combination] = 1
-        else:
-            transition_counts[new_dice_combination] += 1
-    
-    total_num_outcomes = 6 ** num_dice_to_reroll
-    for k in transition_counts:
-        transition_counts[k] = transition_counts[k] / total_num_outcomes
-    
-    return transition_counts
+    ## Reads the precomputed keep -> roll probabilities instead of enumerating every outcome of the reroll
+    rolls, probabilities = DiceTransitions.keep_roll_probabilities(DiceTransitions.KEEP_INDEX[kept_dice])
+    return {
+        DICE_COMBINATIONS[roll] : prob for roll, prob in zip(rolls.tolist(), probabilities.tolist())
+    }
 # pprint(get_reroll_probabilities((1, 2, 2, 2, 2), (1, 2, 2, 2)), sort_dicts = False)
 
 @cache
@@ -170,6 +326,30 @@ def generate_actions(state):
 # for a in generate_actions(((1,3,3,4,5), (0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 1, 0), 1)):
 #     print(a)
 
+def bellman_backup(state, values):
+    ## Returns the best Q-value of a state, given the values of the states (indexed by encode_state), or 0 if the game is over.
+    ## Same as maximizing over the transitions of get_transition_probabilities, but the next states of an action
+    ## share their score table and rerolls left, so their codes are computed from a common base.
+    dice_values, score_table, n_rerolls_left = state
+    table_index = 0
+    for idx, is_filled in enumerate(score_table):
+        table_index |= is_filled << idx
+
+    q_values = []
+    for action in generate_actions(state):
+        is_keep, info = action
+        if is_keep:
+            index_to_assign ,= info
+            base = ((table_index | 1 << index_to_assign) * N_REROLLS + N_REROLLS - 1) * N_DICE_COMBINATIONS
+            dice_probabilities = get_reroll_all_dice_probabilities()
+        else:
+            base = (table_index * N_REROLLS + n_rerolls_left - 1) * N_DICE_COMBINATIONS
+            dice_probabilities = get_reroll_probabilities(dice_values, info)
+        reward = get_reward(state, action)
+        action_q_value = sum((prob * (reward + values[base + DICE_INDEX[next_dice]]) for next_dice, prob in dice_probabilities.items()))
+        q_values.append(action_q_value)
+    return max(q_values) if q_values != [] else 0
+
 def get_transition_probabilities(state, action):
     ## Takes in a state and an action
     ## Returns a dict mapping next_state : probability IF the action was taken
@@ -256,6 +436,63 @@ def get_reward(state, action):
             case _:
                 raise Exception("No possible reward!")
 
+## REWARD_TABLE[dice index, idx] = reward of assigning the dice to the (0-based) column idx
+REWARD_TABLE = np.array([
+    [get_reward((dice_values, (0,) * N_CATEGORIES, 0), (1, (idx, ))) for idx in range(N_CATEGORIES)]
+    for dice_values in DICE_COMBINATIONS
+])
+
+def keep_q_values(table_values, table_index, unfilled):
+    ## Q-values of assigning every roll to each unfilled column of a score table, shape (252, len(unfilled)).
+    ## They do not depend on the rerolls left: reward + expected value of the next table in table_values,
+    ## the values viewed as a (2 ** N_CATEGORIES, N_REROLLS, 252) array.
+    q_values = np.empty((N_DICE_COMBINATIONS, len(unfilled)))
+    for i, idx in enumerate(unfilled):
+        next_value = DiceTransitions.FIRST_ROLL @ table_values[table_index | 1 << idx, N_REROLLS - 1]
+        q_values[:, i] = REWARD_TABLE[:, idx] + next_value
+    return q_values
+
+def reroll_q_values(roll_values):
+    ## Q-values of reroll actions, indexed by the kept dice, from the (252,) values of the rolls with one reroll less.
+    ## Rerolling no dice is not an action: its Q-value is -inf.
+    q_values = DiceTransitions.expected_keep_values(roll_values)
+    q_values[DiceTransitions.KEEP_ALL] = -np.inf
+    return q_values
+
+def extract_policy(utilities):
+    ## Returns the uint16 policy table of the values utilities (indexed by encode_state), computed score table
+    ## by score table with the Q-values of backup_score_table. Rerolls are chosen only when strictly better.
+    values = np.asarray(utilities, dtype = np.float64).reshape(2 ** N_CATEGORIES, N_REROLLS, N_DICE_COMBINATIONS)
+    policy = np.full(values.shape, NO_ACTION, dtype = np.uint16)
+    dice_indices = np.arange(N_DICE_COMBINATIONS)
+
+    for table_index in range(2 ** N_CATEGORIES - 1):
+        unfilled = [idx for idx in range(N_CATEGORIES) if not table_index >> idx & 1]
+        scoring_q_values = keep_q_values(values, table_index, unfilled)
+        best_keep = np.argmax(scoring_q_values, axis = 1)
+        best_keep_q_values = scoring_q_values[dice_indices, best_keep]
+        policy[table_index, :] = SCORE_ACTION + np.array(unfilled)[best_keep]
+
+        for n_rerolls_left in range(1, N_REROLLS):
+            choice_q_values = reroll_q_values(values[table_index, n_rerolls_left - 1])[DiceTransitions.ROLL_KEEP_CHOICES]
+            best_reroll = np.argmax(choice_q_values, axis = 1)
+            is_better = choice_q_values[dice_indices, best_reroll] > best_keep_q_values
+            policy[table_index, n_rerolls_left, is_better] = \
+                DiceTransitions.ROLL_KEEP_CHOICES[dice_indices, best_reroll][is_better]
+    return policy.reshape(N_STATES)
+
+def decode_policy_action(state, action):
+    ## Converts a policy table action into the (int, tuple) action format of generate_actions
+    dice_values, score_table, n_rerolls_left = state
+    if action == NO_ACTION:
+        return None
+    if action >= SCORE_ACTION:
+        return (1, (int(action) - SCORE_ACTION, ))
+    dice_to_reroll = list(dice_values)
+    for die in DiceTransitions.KEEPS[action]:
+        dice_to_reroll.remove(die)
+    return (0, tuple(dice_to_reroll))
+
 def perform_action(state, action):
     transition_probabilities = get_transition_probabilities(state, action)
     return random.choices(list(transition_probabilities.keys()), weights=list(transition_probabilities.values()))
@@ -265,9 +502,10 @@ def perform_action(state, action):
 ## Seed: "CS4246", total_reward = 165
 
 RUN_TEST = True
-if (RUN_TEST == True):
+if __name__ == '__main__' and RUN_TEST == True:
     agent = ValueIterationAgent(Yahtzee.Yahtzee())
     # agent.run_value_iteration(1, save_to_file=False)
+    # agent.run_backward_induction(save_to_file=True)
     # print(get_reroll_all_dice_probabilities())
     rewards = []
     for _ in range(100):
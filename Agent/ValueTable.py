@@ -0,0 +1,126 @@
+import struct
+import numpy as np
+
+## Binary value table format shared by the solvers.
+##
+## A file is a fixed-size header followed by a dense C-ordered array, so that tables can be
+## memory-mapped: agents start without parsing anything, and processes share one page-cached copy.
+## Header fields (little endian):
+##   magic (8 bytes), format version (uint32), ruleset name (32 bytes, ascii), dtype name (16 bytes, ascii),
+##   number of dimensions (uint32), shape padded with zeros to MAX_DIMENSIONS (uint64 each),
+##   and since version 2, the scale and offset (float64 each) of quantized tables
+## Quantized tables store round((value - offset) / scale) as unsigned integers, and are read back as
+## offset + scale * stored value. A scale of 0 means the table is not quantized.
+
+MAGIC = b'YAHTZVT\0'
+VERSION = 2
+MAX_DIMENSIONS = 6
+HEADER_FORMATS = {
+    1: '<8sI32s16sI8Q',
+    VERSION: f'<8sI32s16sI{MAX_DIMENSIONS}Q2d',
+}
+HEADER_FORMAT = HEADER_FORMATS[VERSION]
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)  # = 128, the same for every version
+
+## Storage options for value tables: dtype and whether values are quantized
+PRECISIONS = {
+    'float64': (np.float64, False),
+    'float32': (np.float32, False),
+    'float16': (np.float16, False),
+    'quantized16': (np.uint16, True),
+}
+
+## Rulesets of the solvers writing value tables, with the shape of their tables
+RULESETS = {
+    ## ValueIterationAgent: 7 lower categories, indexed by ValueIterationAgent.encode_state
+    'yahtzee7': (2 ** 7 * 3 * 252,),
+    ## FullGameSolver: 13 categories and upper bonus, indexed by [available mask, capped upper score],
+    ## i.e. by Yahtzee.encode_state(...) // (NUM_REROLL_STATES * NUM_DICE_COMBINATIONS) when flattened
+    'yahtzee13': (2 ** 13, 64),
+}
+
+
+def save_value_table(path, values, ruleset, dtype = np.float32, quantize = False):
+    """
+    Saves a dense table of values (or any other per-state data, e.g. a policy) for a ruleset.
+    With quantize = True, dtype must be an unsigned integer type, and values are scaled to its whole range.
+    """
+    if ruleset not in RULESETS:
+        raise Exception(f"Unknown ruleset {ruleset}, expected one of {list(RULESETS)}.")
+    values = np.asarray(values)
+    if values.shape[:len(RULESETS[ruleset])] != RULESETS[ruleset]:
+        raise Exception(f"Table of shape {values.shape} does not match ruleset {ruleset} {RULESETS[ruleset]}.")
+
+    scale, offset = 0.0, 0.0
+    if quantize:
+        if np.dtype(dtype).kind != 'u':
+            raise Exception(f"Quantized tables need an unsigned integer dtype, got {np.dtype(dtype).name}.")
+        offset = float(values.min())
+        scale = (float(values.max()) - offset) / np.iinfo(dtype).max or 1.0
+        values = np.rint((values - offset) / scale)
+    values = np.ascontiguousarray(values, dtype = dtype)
+
+    shape = values.shape + (0,) * (MAX_DIMENSIONS - values.ndim)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, ruleset.encode('ascii'), values.dtype.name.encode('ascii'),
+                         values.ndim, *shape, scale, offset)
+    with open(path, 'wb') as output:
+        output.write(header)
+        output.write(values.tobytes())
+
+
+def read_header(path):
+    """
+    Returns the header of a value table file as a dict with keys version, ruleset, dtype, shape, scale and offset.
+    """
+    with open(path, 'rb') as table_file:
+        header = table_file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        raise Exception(f"{path} is not a value table file.")
+    version, = struct.unpack_from('<I', header, len(MAGIC))
+    if version not in HEADER_FORMATS:
+        raise Exception(f"{path} has format version {version}, expected at most {VERSION}.")
+    magic, version, ruleset, dtype, ndim, *fields = struct.unpack(HEADER_FORMATS[version], header)
+    scale, offset = fields[-2:] if version >= 2 else (0.0, 0.0)
+    return {
+        'version': version,
+        'ruleset': ruleset.rstrip(b'\0').decode('ascii'),
+        'dtype': np.dtype(dtype.rstrip(b'\0').decode('ascii')),
+        'shape': tuple(fields[:ndim]),
+        'scale': scale,
+        'offset': offset,
+    }
+
+
+def load_value_table(path, ruleset = None):
+    """
+    Memory-maps a value table file read-only. Throws an exception if it was saved for another ruleset.
+    Quantized tables are returned as a QuantizedTable, which dequantizes the entries it is indexed with.
+    """
+    header = read_header(path)
+    if ruleset is not None and header['ruleset'] != ruleset:
+        raise Exception(f"{path} holds a {header['ruleset']} table, expected {ruleset}.")
+    table = np.memmap(path, dtype = header['dtype'], mode = 'r', offset = HEADER_SIZE, shape = header['shape'])
+    if header['scale'] != 0:
+        return QuantizedTable(table, header['scale'], header['offset'])
+    return table
+
+
+class QuantizedTable:
+    ## Read-only view of a quantized table: indexing returns float64 values, like indexing a value table
+    def __init__(self, stored, scale, offset):
+        self.stored = stored
+        self.scale = scale
+        self.offset = offset
+        self.shape = stored.shape
+        self.ndim = stored.ndim
+        self.nbytes = stored.nbytes
+
+    def __getitem__(self, key):
+        return self.offset + self.scale * self.stored[key].astype(np.float64)
+
+    def __len__(self):
+        return len(self.stored)
+
+    def __array__(self, dtype = None, copy = None):
+        values = self.offset + self.scale * np.asarray(self.stored, dtype = np.float64)
+        return values if dtype is None else values.astype(dtype)
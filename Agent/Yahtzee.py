@@ -1,6 +1,6 @@
 import numpy as np
-from random import choice
-from typing import List
+from typing import List, NamedTuple, Optional
+from itertools import combinations_with_replacement
 
 DIE_CHOICES = [i for i in range(1, 7)]
 
@@ -9,22 +9,127 @@ NUM_CATEGORIES = 14
 NUM_UPPER = 6  # number of upper categories
 MAX_REROLLS = 3  # includes initial roll
 BONUS_THRESHOLD = 63
+BONUS_SCORE = 35
 EMPTY = np.iinfo(np.uint8).max  # = 255
+LOG_MODES = ('object', 'binary', 'none')
+DICE_BLOCK_SIZE = 1 << 16  # maximum number of die faces drawn from the RNG at a time
+FIRST_DICE_BLOCK_SIZE = NUM_DICE * MAX_REROLLS * (NUM_CATEGORIES - 1)  # faces of one full game at most
+
+
+class DiceStream:
+    """
+    Seedable source of die faces. Faces are drawn from a numpy Generator a block at a time
+    and handed out with a cursor, instead of calling the RNG once per die.
+    The first block holds the faces of one game, and blocks double up to block_size,
+    so that streams of short-lived games stay cheap to create.
+    """
+
+    def __init__(self, seed=None, block_size: int = DICE_BLOCK_SIZE):
+        self.rng = np.random.default_rng(seed)
+        self.copies_rng = None
+        self.block_size = block_size
+        self.next_block_size = min(FIRST_DICE_BLOCK_SIZE, block_size)
+        self.block = []
+        self.cursor = 0
+
+    def draw(self, count: int) -> List[int]:
+        """
+        Returns the next `count` die faces.
+        """
+        if self.cursor + count > len(self.block):
+            size = max(self.next_block_size, count)
+            self.block = self.rng.integers(1, len(DIE_CHOICES) + 1, size, dtype=np.uint8).tolist()
+            self.cursor = 0
+            self.next_block_size = min(2 * self.next_block_size, self.block_size)
+        faces = self.block[self.cursor:self.cursor + count]
+        self.cursor += count
+        return faces
+
+    def copy(self):
+        """
+        Returns a stream of new faces, independent of this one and of its other copies.
+        The copies of a stream draw their blocks from one generator spawned from it on the first copy,
+        so that copying is cheap and never changes the faces this stream hands out.
+        """
+        if self.copies_rng is None:
+            self.copies_rng = self.rng.spawn(1)[0]
+        stream = DiceStream.__new__(DiceStream)
+        stream.rng = self.copies_rng
+        stream.copies_rng = None
+        stream.block_size = self.block_size
+        stream.next_block_size = min(FIRST_DICE_BLOCK_SIZE, self.block_size)
+        stream.block = []
+        stream.cursor = 0
+        return stream
+
+
+class YahtzeeSnapshot(NamedTuple):
+    """
+    Immutable record of the state of a Yahtzee game, see Yahtzee.snapshot().
+    """
+    dice: tuple
+    rerolls: int
+    round: int
+    scoresheet: bytes
+    bonus_round: Optional[int]
+    upper_score: int
+    total_score: int
+    available_mask: int
+    binary_log_length: int
+
 
 class Yahtzee:
 
-    def __init__(self):
+    __slots__ = (
+        'log_mode',
+        'dice_stream',
+        'dice',
+        'scoresheet',
+        'bonus_round',
+        'upper_score',
+        'total_score',
+        'available_mask',
+        'log',
+        'binary_log',
+        'binary_log_length',
+        'round',
+        'rerolls',
+    )
+
+    def __init__(self, log_mode: str = 'object', seed=None):
+        """
+        log_mode (str): 'object' keeps the (NUM_CATEGORIES x 3) object log below,
+                        'binary' keeps a fixed-size uint8 log (see BINARY_LOG_* below),
+                        'none' disables logging (undo_round() is then unavailable).
+        seed: Seed of the dice of this game, games with the same seed and moves roll the same dice.
+        """
+        if log_mode not in LOG_MODES:
+            raise Exception(f"Unknown log mode {log_mode}, expected one of {LOG_MODES}.")
+        self.log_mode = log_mode
+        self.dice_stream = DiceStream(seed)
+
         # Stage setup.
         self.dice = np.zeros(NUM_DICE, dtype=np.uint8)
         self.scoresheet = np.full(NUM_CATEGORIES, EMPTY, dtype=np.uint8)
         self.scoresheet[CATEGORY_NAME2ID['Bonus']] = 0  # Bonus category should be initialized to 0 not EMPTY
-        self.log = np.empty((NUM_CATEGORIES, 3), dtype=object)
+        self.bonus_round = None  # round the bonus was achieved in
+        # Running totals of the score sheet, updated by write_score() and undo_round().
+        self.upper_score = 0
+        self.total_score = 0
+        self.available_mask = ALL_CATEGORIES_MASK
+        self.log = None
+        if log_mode == 'object':
+            self.log = np.empty((NUM_CATEGORIES, 3), dtype=object)
         # Log is (NUM_CATEGORIES x 3) array where:
         #       First column: Category chosen
         #       Second column: Score written
         #       Third column: Result of dice rolls (1 to 3 rolls) done in that round.
         # Bonus point is logged immediately at last row when achieved, with thirdrow showing the round it was achieved.
         # If bonus point is not achieved, the last row will be empty.
+        self.binary_log = None
+        self.binary_log_length = 0
+        if log_mode == 'binary':
+            self.binary_log = np.zeros((BINARY_LOG_RECORDS, BINARY_LOG_RECORD_SIZE), dtype=np.uint8)
 
         # Initial dice roll.
         self.round = 0
@@ -35,7 +140,15 @@ class Yahtzee:
         self.round = 0
         self.rerolls = MAX_REROLLS
         self.scoresheet = np.full(NUM_CATEGORIES, EMPTY, dtype=np.uint8)
-        self.log = np.empty((NUM_CATEGORIES, 3), dtype=object)
+        self.bonus_round = None
+        self.upper_score = 0
+        self.total_score = 0
+        self.available_mask = ALL_CATEGORIES_MASK
+        if self.log_mode == 'object':
+            self.log = np.empty((NUM_CATEGORIES, 3), dtype=object)
+        elif self.log_mode == 'binary':
+            self.binary_log[:] = 0
+            self.binary_log_length = 0
         self.roll_dice(np.array([False, False, False, False, False]))
         
     # State: Tuple(dice: list, rerolls: int, available_categories: list)
@@ -54,11 +167,29 @@ class Yahtzee:
             self.roll_dice(action[1])
         return (tuple(self.dice.tolist()), self.rerolls, tuple(self.get_available_categories())), rewards
 
+    # Encoded state: int packing (dice index, rerolls, available category mask, capped upper score)
+    # Use decode_state() to unpack it.
+    def getEncodedState(self):
+        return encode_state(dice_index(self.dice), self.rerolls, self.available_mask, self.upper_score)
+
+    # Same as doAction, but returns the encoded nextState
+    def doEncodedAction(self, action):
+        rewards = 0
+        if action[0] == "KEEP":
+            rewards = self.getScore(action[1])
+            self.write_score(action[1])
+        else:
+            self.roll_dice(action[1])
+        return self.getEncodedState(), rewards
+
     # Get the score for the chosen category
     def getScore(self, category_id):
-        potential_scores = self.potential_score()
-        # print("Potential Scores:", potential_scores)
-        return potential_scores[category_id]
+        if self.scoresheet[category_id] != EMPTY:
+            return -1
+        score = SCORE_TABLE_ROWS[dice_index(self.dice)][category_id]
+        if category_id < NUM_UPPER and self.upper_score + score >= BONUS_THRESHOLD:
+            score += BONUS_SCORE
+        return score
     
     def roll_dice(self, indices):
         """
@@ -74,18 +205,34 @@ class Yahtzee:
         
         # Randomly choose numbers for dice roll.
         # TRUE MEANS TO KEEP; FALSE MEANS TO REROLL
-        for i, choose in enumerate(indices[:5]):
-            if not choose:
-                self.dice[i] = choice(DIE_CHOICES)
+        indices = indices[:NUM_DICE]
+        if type(indices) == np.ndarray:
+            indices = indices.tolist()
+        rerolled = [i for i, choose in enumerate(indices) if not choose]
+        for i, face in zip(rerolled, self.dice_stream.draw(len(rerolled))):
+            self.dice[i] = face
         
         # Logging result of dice roll.
-        if self.log[self.round, 2] == None:
-            self.log[self.round, 2] = [self.dice]
-        else:
-            self.log[self.round, 2].append(self.dice)
+        self._log_roll(self.dice, BINARY_LOG_ROLL)
         
         self.rerolls -= 1
 
+    def _log_roll(self, dice, kind):
+        if self.log_mode == 'object':
+            if self.log[self.round, 2] is None:
+                self.log[self.round, 2] = [dice.copy()]
+            else:
+                self.log[self.round, 2].append(dice.copy())
+        elif self.log_mode == 'binary':
+            self._log_record(kind, dice)
+
+    def _log_record(self, kind, payload):
+        record = self.binary_log[self.binary_log_length]
+        record[0] = kind
+        record[1] = self.round
+        record[2:2 + len(payload)] = payload
+        self.binary_log_length += 1
+
 
     def get_dice(self):
         return self.dice
@@ -109,24 +256,18 @@ class Yahtzee:
         By definition, upper section categories' scores also include bonus point if satisfied.
         If the category is already filled, it is set to -1.
         """
-        potential_sheet = np.full((NUM_CATEGORIES - 1), -1, int)
-        for category in range(NUM_CATEGORIES - 1):
-            if self.scoresheet[category] != EMPTY:
-                continue
-            score = 0
-            check = CATEGORIES_CHECK[category]
-            if check(self.dice):
-                scoring = CATEGORIES_SCORING[category]
-                score = scoring(self.dice)
-            # Bonus check for upper section.
-            if category < NUM_UPPER:
-                segment = self.scoresheet[0:NUM_UPPER]
-                bonus_check = np.sum(segment[segment != EMPTY]) + score
-                # print("Bonus Check:", bonus_check)
-                if bonus_check >= BONUS_THRESHOLD:
-                    score += CATEGORIES_SCORING[NUM_CATEGORIES-1](self.dice)
-            potential_sheet[category] = score
+        potential_sheet = SCORE_TABLE[dice_index(self.dice)].astype(int)
+        # Bonus check for upper section.
+        upper_sheet = potential_sheet[:NUM_UPPER]
+        upper_sheet[self.upper_score + upper_sheet >= BONUS_THRESHOLD] += BONUS_SCORE
+        potential_sheet[self.scoresheet[:NUM_CATEGORIES - 1] != EMPTY] = -1
         return potential_sheet
+
+    def get_upper_score(self):
+        """
+        Returns the sum of the written upper section categories.
+        """
+        return self.upper_score
     
     def get_display_scoresheet(self):
         ## If a category is available, displays "--- (POTENTIAL_SCORE)"
@@ -151,10 +292,13 @@ class Yahtzee:
         Returns indices of all available (non-written) categories.
         Returns empty list if all categories are written and game is over.
         """
-        available_categories = np.nonzero(self.scoresheet == EMPTY)[0].tolist()
-        if NUM_CATEGORIES-1 in available_categories:
-            available_categories.remove(NUM_CATEGORIES-1)
-        return available_categories
+        return mask_to_categories(self.available_mask)
+
+    def get_available_mask(self):
+        """
+        Returns the available (non-written) categories as a bitmask, where bit i is set if category i is available.
+        """
+        return self.available_mask
 
 
     def write_score(
@@ -184,28 +328,34 @@ class Yahtzee:
         if type(dice) != np.ndarray:
             dice = self.dice
         else:
-            self.log[self.round, 2].append(dice)
+            self._log_roll(dice, BINARY_LOG_DICE)
 
         # Calculate score.
-        score = 0  # 0 if not applicable
-        check = CATEGORIES_CHECK[category]
-        if check(dice):
-            scoring = CATEGORIES_SCORING[category]
-            score = scoring(dice)
+        score = SCORE_TABLE_ROWS[dice_index(dice)][category]
         
         # Write in the score.
         self.scoresheet[category] = score
-        self.log[self.round, 0] = CATEGORIES_NAMES[category]
-        self.log[self.round, 1] = score
+        self.total_score += score
+        self.available_mask &= ~(1 << category)
+        if category < NUM_UPPER:
+            self.upper_score += score
+        if self.log_mode == 'object':
+            self.log[self.round, 0] = CATEGORIES_NAMES[category]
+            self.log[self.round, 1] = score
 
         # Check for Bonus category.
-        segment = self.scoresheet[0:NUM_UPPER]
-        upper_score = np.sum(segment[segment != EMPTY])
-        if upper_score >= BONUS_THRESHOLD and self.log[NUM_CATEGORIES-1, 2] == None:
-            self.scoresheet[NUM_CATEGORIES-1] = CATEGORIES_SCORING[NUM_CATEGORIES-1](self.dice)
-            self.log[NUM_CATEGORIES-1, 0] = CATEGORIES_NAMES[NUM_CATEGORIES-1]
-            self.log[NUM_CATEGORIES-1, 1] = CATEGORIES_SCORING[NUM_CATEGORIES-1](self.dice)
-            self.log[NUM_CATEGORIES-1, 2] = self.round
+        bonus = 0
+        if self.upper_score >= BONUS_THRESHOLD and self.bonus_round is None:
+            bonus = CATEGORIES_SCORING[NUM_CATEGORIES-1](self.dice)
+            self.scoresheet[NUM_CATEGORIES-1] = bonus
+            self.total_score += bonus
+            self.bonus_round = self.round
+            if self.log_mode == 'object':
+                self.log[NUM_CATEGORIES-1, 0] = CATEGORIES_NAMES[NUM_CATEGORIES-1]
+                self.log[NUM_CATEGORIES-1, 1] = bonus
+                self.log[NUM_CATEGORIES-1, 2] = self.round
+        if self.log_mode == 'binary':
+            self._log_record(BINARY_LOG_WRITE, (category, score, bonus))
 
         # Set up for next round.
         self.round += 1
@@ -229,29 +379,295 @@ class Yahtzee:
         prev_round = self.round - 1
         if prev_round < 0:
             raise Exception("No rounds left to undo.")
-        prev_write = CATEGORIES_NAMES.index(self.log[prev_round, 0])
-        prev_rolls = self.log[prev_round, 2]
-        initial_roll = prev_rolls[0]
-        bonus_round = self.log[NUM_CATEGORIES - 1, 2]
+        if self.log_mode == 'object':
+            prev_write = CATEGORIES_NAMES.index(self.log[prev_round, 0])
+            prev_rolls = self.log[prev_round, 2]
+            initial_roll = prev_rolls[0]
+        elif self.log_mode == 'binary':
+            records = self.binary_log[:self.binary_log_length]
+            prev_records = np.nonzero(records[:, 1] == prev_round)[0]
+            initial_record = prev_records[0]
+            prev_write = int(records[prev_records[-1], 2])
+            initial_roll = records[initial_record, 2:2 + NUM_DICE].copy()
+        else:
+            raise Exception("Cannot undo a round without a game log.")
 
         # Undo round.
         self.round -= 1
         self.rerolls = MAX_REROLLS - 1
-        self.dice = initial_roll
+        self.dice = initial_roll.copy()
+        prev_score = int(self.scoresheet[prev_write])
         self.scoresheet[prev_write] = EMPTY
-        self.log[prev_round] = [None, None, None]
-        if bonus_round == prev_round:  # if bonus was also achieved previous round
+        self.total_score -= prev_score
+        self.available_mask |= 1 << prev_write
+        if prev_write < NUM_UPPER:
+            self.upper_score -= prev_score
+        if self.log_mode == 'object':
+            self.log[prev_round, 0] = None
+            self.log[prev_round, 1] = None
+            self.log[prev_round, 2] = [initial_roll]
+            if prev_round + 1 < NUM_CATEGORIES - 1:
+                self.log[prev_round + 1] = [None, None, None]
+        else:
+            self.binary_log[initial_record + 1:] = 0
+            self.binary_log_length = initial_record + 1
+        if self.bonus_round == prev_round:  # if bonus was also achieved previous round
+            self.total_score -= int(self.scoresheet[NUM_CATEGORIES - 1])
             self.scoresheet[NUM_CATEGORIES - 1] = 0
-            self.log[NUM_CATEGORIES - 1] = [None, None, None]
+            self.bonus_round = None
+            if self.log_mode == 'object':
+                self.log[NUM_CATEGORIES - 1] = [None, None, None]
+
+    def get_binary_log(self):
+        """
+        Returns a copy of the fixed-size binary log (see BINARY_LOG_* below).
+        """
+        return self.binary_log.copy()
+
+    @classmethod
+    def replay(cls, binary_log: np.ndarray, log_mode: str = 'none'):
+        """
+        Rebuilds the game recorded in a binary log, up to its last record.
+        """
+        game = cls(log_mode='none')
+        rolled_round = -1
+        given_dice = None
+        for record in binary_log:
+            kind, round = record[0], record[1]
+            if kind == BINARY_LOG_ROLL:
+                # Initial rolls are done by the constructor and write_score(), only rerolls are counted here.
+                game.dice = record[2:2 + NUM_DICE].copy()
+                if round == rolled_round:
+                    game.rerolls -= 1
+                rolled_round = round
+            elif kind == BINARY_LOG_DICE:
+                given_dice = record[2:2 + NUM_DICE].copy()
+            elif kind == BINARY_LOG_WRITE:
+                game.write_score(int(record[2]), given_dice)
+                given_dice = None
+
+        if log_mode == 'binary':
+            game.log_mode = log_mode
+            game.binary_log = np.array(binary_log, dtype=np.uint8)
+            game.binary_log_length = int(np.count_nonzero(game.binary_log[:, 0]))
+        elif log_mode != 'none':
+            raise Exception("Games can only be replayed with 'binary' or 'none' log mode.")
+        return game
 
 
     def calculate_score(self):
         """
         Calculates total score of the current score sheet.
         """
-        total_score = np.sum(self.scoresheet[self.scoresheet[:] != 255])
-        #total_score += self.get_bonus()
-        return total_score
+        return self.total_score
+
+    def snapshot(self) -> YahtzeeSnapshot:
+        """
+        Returns an immutable record of the current state of the game, to be given to restore().
+        """
+        return YahtzeeSnapshot(
+            tuple(self.dice.tolist()),
+            self.rerolls,
+            self.round,
+            self.scoresheet.tobytes(),
+            self.bonus_round,
+            self.upper_score,
+            self.total_score,
+            self.available_mask,
+            self.binary_log_length,
+        )
+
+    def restore(self, snapshot: YahtzeeSnapshot):
+        """
+        Restores the game to a snapshot in place, without reallocating any arrays.
+        The object log is left as is and the binary log is truncated back to the snapshot,
+        so logs are only kept consistent when restoring to an earlier snapshot.
+        """
+        self.dice[:] = snapshot.dice
+        self.rerolls = snapshot.rerolls
+        self.round = snapshot.round
+        self.scoresheet[:] = np.frombuffer(snapshot.scoresheet, dtype=np.uint8)
+        self.bonus_round = snapshot.bonus_round
+        self.upper_score = snapshot.upper_score
+        self.total_score = snapshot.total_score
+        self.available_mask = snapshot.available_mask
+        if self.log_mode == 'binary':
+            self.binary_log[snapshot.binary_log_length:self.binary_log_length] = 0
+            self.binary_log_length = snapshot.binary_log_length
+
+    def clone(self):
+        """
+        Returns a copy of the game without any log.
+        The copy rolls its own dice (see DiceStream.copy()): independent of the dice this game and its
+        other copies roll, and rolling them leaves the dice of this game unchanged.
+        """
+        game = type(self).__new__(type(self))
+        game.log_mode = 'none'
+        game.log = None
+        game.binary_log = None
+        game.binary_log_length = 0
+        game.dice_stream = self.dice_stream.copy()
+        game.dice = self.dice.copy()
+        game.scoresheet = self.scoresheet.copy()
+        game.bonus_round = self.bonus_round
+        game.upper_score = self.upper_score
+        game.total_score = self.total_score
+        game.available_mask = self.available_mask
+        game.round = self.round
+        game.rerolls = self.rerolls
+        return game
+
+
+class YahtzeeBatch:
+    """
+    Runs N independent games in lockstep, with the same rules as Yahtzee.
+    Dice are held in a (N, NUM_DICE) array and score sheets in a (N, NUM_CATEGORIES) array,
+    so every operation below acts on all selected games at once.
+    Methods take an optional boolean mask `games` of shape (N,) selecting the games to act on;
+    by default every game that is not over is selected.
+    """
+
+    def __init__(self, num_games: int, seed=None):
+        self.num_games = num_games
+        self.rng = np.random.default_rng(seed)
+        self.dice = np.zeros((num_games, NUM_DICE), dtype=np.uint8)
+        self.scoresheet = np.full((num_games, NUM_CATEGORIES), EMPTY, dtype=np.uint8)
+        self.round = np.zeros(num_games, dtype=np.int64)
+        self.rerolls = np.zeros(num_games, dtype=np.int64)
+        self.bonus_achieved = np.zeros(num_games, dtype=bool)
+        self.reset()
+
+    def reset(self, games: np.ndarray = None):
+        """
+        Starts new games (all games if unspecified) and rolls their initial dice.
+        """
+        if games is None:
+            games = np.ones(self.num_games, dtype=bool)
+        self.scoresheet[games] = EMPTY
+        self.scoresheet[games, CATEGORY_NAME2ID['Bonus']] = 0
+        self.round[games] = 0
+        self.rerolls[games] = MAX_REROLLS
+        self.bonus_achieved[games] = False
+        self.roll_dice(np.zeros((self.num_games, NUM_DICE), dtype=bool), games)
+
+    def _select(self, games):
+        if games is None:
+            return ~self.is_over()
+        return np.asarray(games, dtype=bool)
+
+    def roll_dice(self, keep: np.ndarray, games: np.ndarray = None):
+        """
+        Takes in a (N, NUM_DICE) boolean array; TRUE MEANS TO KEEP; FALSE MEANS TO REROLL.
+        Rolls the dice of the selected games.
+        Throws an exception if a selected game has no rerolls left or is over.
+        """
+        games = self._select(games)
+        if np.any(self.rerolls[games] == 0):
+            raise Exception("You have no rerolls left.")
+        if np.any(self.round[games] >= NUM_CATEGORIES - 1):
+            raise Exception("Game is already over.")
+
+        reroll = ~np.asarray(keep, dtype=bool)[:, :NUM_DICE] & games[:, None]
+        faces = self.rng.integers(1, len(DIE_CHOICES) + 1, size=self.dice.shape, dtype=np.uint8)
+        self.dice[reroll] = faces[reroll]
+        self.rerolls[games] -= 1
+
+    def dice_indices(self):
+        """
+        Returns the canonical dice index (0 to 251) of every game.
+        """
+        return dice_indices(self.dice)
+
+    def get_upper_score(self):
+        """
+        Returns the sum of the written upper section categories of every game.
+        """
+        segment = self.scoresheet[:, :NUM_UPPER]
+        return np.where(segment != EMPTY, segment, 0).sum(axis=1)
+
+    def get_available_categories(self):
+        """
+        Returns a (N, NUM_CATEGORIES - 1) boolean array of available (non-written) categories.
+        """
+        return self.scoresheet[:, :NUM_CATEGORIES - 1] == EMPTY
+
+    def potential_score(self):
+        """
+        Returns a (N, NUM_CATEGORIES - 1) array of potential scores with the current dice.
+        Same conventions as Yahtzee.potential_score(): upper section categories include the bonus
+        if satisfied, and filled categories are set to -1.
+        """
+        potential_sheet = SCORE_TABLE[self.dice_indices()].astype(int)
+        upper_sheet = potential_sheet[:, :NUM_UPPER]
+        upper_sheet[self.get_upper_score()[:, None] + upper_sheet >= BONUS_THRESHOLD] += BONUS_SCORE
+        potential_sheet[~self.get_available_categories()] = -1
+        return potential_sheet
+
+    def getScore(self, categories: np.ndarray):
+        """
+        Returns the potential score of the chosen category of every game.
+        """
+        return np.take_along_axis(self.potential_score(), np.asarray(categories)[:, None], axis=1)[:, 0]
+
+    def write_score(self, categories: np.ndarray, games: np.ndarray = None):
+        """
+        Writes into the score sheet of every selected game at its category in `categories` (shape (N,)).
+        Automatically writes in Bonus category if conditions satisfied, then rolls the next round.
+        Throws an exception if a selected game writes in Bonus category, an already written category,
+        or is over.
+
+        Returns:
+        np.ndarray of int: Final score for the selected games that ended, 0 otherwise.
+        """
+        games = self._select(games)
+        categories = np.asarray(categories)
+        rows = np.nonzero(games)[0]
+        chosen = categories[rows]
+        if np.any(chosen >= NUM_CATEGORIES - 1):
+            raise Exception("You cannot write in Bonus category.")
+        if np.any(self.scoresheet[rows, chosen] != EMPTY):
+            raise Exception("Category already written.")
+        if np.any(self.round[rows] >= NUM_CATEGORIES - 1):
+            raise Exception("Game is already over.")
+
+        # Write in the score.
+        self.scoresheet[rows, chosen] = SCORE_TABLE[dice_indices(self.dice[rows]), chosen]
+
+        # Check for Bonus category.
+        bonus = games & ~self.bonus_achieved & (self.get_upper_score() >= BONUS_THRESHOLD)
+        self.scoresheet[bonus, CATEGORY_NAME2ID['Bonus']] = BONUS_SCORE
+        self.bonus_achieved |= bonus
+
+        # Set up for next round.
+        self.round[games] += 1
+        self.rerolls[games] = MAX_REROLLS
+        over = self.is_over()
+        self.roll_dice(np.zeros((self.num_games, NUM_DICE), dtype=bool), games & ~over)
+        return np.where(games & over, self.calculate_score(), 0)
+
+    def get_available_mask(self):
+        """
+        Returns the available categories of every game as bitmasks (see Yahtzee.get_available_mask()).
+        """
+        return self.get_available_categories() @ CATEGORY_BITS
+
+    def encoded_states(self):
+        """
+        Returns the encoded state of every game (see encode_state()).
+        """
+        return encode_states(self.dice_indices(), self.rerolls, self.get_available_mask(), self.get_upper_score())
+
+    def is_over(self):
+        """
+        Returns a (N,) boolean array of games that are over.
+        """
+        return self.round >= NUM_CATEGORIES - 1
+
+    def calculate_score(self):
+        """
+        Calculates total score of every score sheet.
+        """
+        return np.where(self.scoresheet != EMPTY, self.scoresheet, 0).sum(axis=1)
 
 
 # Category names.
@@ -335,4 +751,128 @@ CATEGORIES = dict(
         CATEGORIES_SCORING,
         CATEGORIES_CHECK
     )]
-)
\ No newline at end of file
+)
+
+
+# All distinct dice rolls as sorted tuples (252 multisets of 5 dice).
+DICE_COMBINATIONS = list(combinations_with_replacement(DIE_CHOICES, NUM_DICE))
+NUM_DICE_COMBINATIONS = len(DICE_COMBINATIONS)
+
+DICE_INDEX = {dice: idx for idx, dice in enumerate(DICE_COMBINATIONS)}
+
+
+def dice_index(dice) -> int:
+    """
+    Returns the canonical index (0 to 251) of a dice roll, irrespective of the order of the dice.
+    """
+    if type(dice) == np.ndarray:
+        dice = dice.tolist()
+    return DICE_INDEX[tuple(sorted(dice))]
+
+
+# Dice are also keyed by their face counts written in base 6 (a count never exceeds 5),
+# which maps whole arrays of rolls to their canonical index without sorting.
+DICE_KEY_WEIGHTS = np.array([0] + [6 ** (die - 1) for die in DIE_CHOICES])  # indexed by face value
+DICE_KEY2INDEX = np.full(6 ** len(DIE_CHOICES), -1, dtype=np.int64)
+for idx, combination in enumerate(DICE_COMBINATIONS):
+    DICE_KEY2INDEX[DICE_KEY_WEIGHTS[list(combination)].sum()] = idx
+
+
+def dice_indices(dice: np.ndarray) -> np.ndarray:
+    """
+    Returns the canonical indices of a (N, NUM_DICE) array of dice rolls.
+    """
+    return DICE_KEY2INDEX[DICE_KEY_WEIGHTS[dice].sum(axis=-1)]
+
+
+def _build_score_table():
+    # Scores every category (excluding Bonus) once per multiset using the scoring rules above.
+    table = np.zeros((NUM_DICE_COMBINATIONS, NUM_CATEGORIES - 1), dtype=np.uint8)
+    for idx, combination in enumerate(DICE_COMBINATIONS):
+        dice = np.array(combination)
+        for category in range(NUM_CATEGORIES - 1):
+            if CATEGORIES_CHECK[category](dice):
+                table[idx, category] = CATEGORIES_SCORING[category](dice)
+    return table
+
+
+# Score of each category (without upper bonus), indexed by [dice_index(dice), category].
+SCORE_TABLE = _build_score_table()
+SCORE_TABLE.flags.writeable = False
+SCORE_TABLE_ROWS = SCORE_TABLE.tolist()  # same table as nested lists, for fast scalar lookups
+
+
+# Encoded states pack (dice index, rerolls, available category mask, upper score capped at BONUS_THRESHOLD)
+# into a single int in [0, NUM_ENCODED_STATES), with the score sheet part most significant so that
+# all states sharing a score sheet are contiguous.
+NUM_CATEGORY_MASKS = 2 ** (NUM_CATEGORIES - 1)
+NUM_UPPER_SCORES = BONUS_THRESHOLD + 1
+NUM_REROLL_STATES = MAX_REROLLS + 1
+NUM_ENCODED_STATES = NUM_CATEGORY_MASKS * NUM_UPPER_SCORES * NUM_REROLL_STATES * NUM_DICE_COMBINATIONS
+CATEGORY_BITS = 1 << np.arange(NUM_CATEGORIES - 1)
+ALL_CATEGORIES_MASK = NUM_CATEGORY_MASKS - 1
+
+
+def encode_state(dice_idx: int, rerolls: int, available_mask: int, upper_score: int) -> int:
+    """
+    Packs a state into a single int. Upper scores above BONUS_THRESHOLD are capped.
+    """
+    if upper_score > BONUS_THRESHOLD:
+        upper_score = BONUS_THRESHOLD
+    return (((available_mask * NUM_UPPER_SCORES + upper_score) * NUM_REROLL_STATES + rerolls)
+            * NUM_DICE_COMBINATIONS + dice_idx)
+
+
+def encode_states(dice_idx: np.ndarray, rerolls: np.ndarray, available_mask: np.ndarray, upper_score: np.ndarray) -> np.ndarray:
+    """
+    Same as encode_state() for arrays of states.
+    """
+    upper_score = np.minimum(upper_score, BONUS_THRESHOLD).astype(np.int64)
+    return (((available_mask * NUM_UPPER_SCORES + upper_score) * NUM_REROLL_STATES + rerolls)
+            * NUM_DICE_COMBINATIONS + dice_idx)
+
+
+def decode_state(state):
+    """
+    Unpacks an encoded state (or an array of them).
+
+    Returns:
+    Tuple(dice_idx, rerolls, available_mask, upper_score)
+    """
+    state, dice_idx = divmod(state, NUM_DICE_COMBINATIONS)
+    state, rerolls = divmod(state, NUM_REROLL_STATES)
+    available_mask, upper_score = divmod(state, NUM_UPPER_SCORES)
+    return dice_idx, rerolls, available_mask, upper_score
+
+
+def mask_to_categories(available_mask: int) -> List[int]:
+    """
+    Returns indices of the categories set in a category bitmask.
+    """
+    return [category for category in range(NUM_CATEGORIES - 1) if available_mask >> category & 1]
+
+
+# Binary log is a fixed-size (BINARY_LOG_RECORDS x BINARY_LOG_RECORD_SIZE) uint8 array, one record per row:
+#       First byte: Record kind (0 marks unused rows)
+#       Second byte: Round of the record
+#       Remaining bytes: Dice for BINARY_LOG_ROLL and BINARY_LOG_DICE (dice given to write_score()),
+#                        category, score and bonus written for BINARY_LOG_WRITE.
+BINARY_LOG_ROLL = 1
+BINARY_LOG_DICE = 2
+BINARY_LOG_WRITE = 3
+BINARY_LOG_RECORD_SIZE = 2 + NUM_DICE
+BINARY_LOG_RECORDS = (NUM_CATEGORIES - 1) * (MAX_REROLLS + 2)  # rolls, given dice and write of every round
+
+
+def save_binary_logs(path: str, binary_logs: List[np.ndarray]):
+    """
+    Saves binary logs of many games as a single (games x BINARY_LOG_RECORDS x BINARY_LOG_RECORD_SIZE) .npy file.
+    """
+    np.save(path, np.stack(binary_logs).astype(np.uint8, copy=False))
+
+
+def load_binary_logs(path: str) -> np.ndarray:
+    """
+    Memory-maps binary logs saved by save_binary_logs().
+    """
+    return np.load(path, mmap_mode='r')
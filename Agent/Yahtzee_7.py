@@ -1,5 +1,6 @@
 import numpy as np
 from typing import List
+from Yahtzee import DiceStream
 
 DIE_CHOICES = [i for i in range(1, 7)]
 
@@ -8,17 +9,23 @@ NUM_CATEGORIES = 7
 MAX_REROLLS = 3  # includes initial roll
 EMPTY = np.iinfo(np.uint8).max  # = 255
 PRNG_SEED = 77
-PRNG = np.random.RandomState(PRNG_SEED)
+
+
+# Games without their own seed share this stream, so a run of games is reproducible.
+PRNG = DiceStream(PRNG_SEED)
 
 class Yahtzee:
 
     def __init__(
             self,
-            return_sorted_dice: bool = False
+            return_sorted_dice: bool = False,
+            seed = None
         ):
         # Stage setup.
+        self.dice_stream = PRNG if seed is None else DiceStream(seed)
         self.dice = np.zeros(NUM_DICE, dtype=np.uint8)
         self.scoresheet = np.full(NUM_CATEGORIES, EMPTY, dtype=np.uint8)
+        self.filled_mask = 0  # bit i set when category i is written, kept in step with the scoresheet
         self.log = np.empty((NUM_CATEGORIES, 3), dtype=object)
         
         # Log is (NUM_CATEGORIES x 3) array where:
@@ -42,6 +49,7 @@ class Yahtzee:
         self.dice = np.array(dice)
         for category in categories_exclude:
             self.scoresheet[category] = 0
+            self.filled_mask |= 1 << category
         self.round = 7 - len(categories_exclude)
         self.rerolls = rerolls
 
@@ -49,6 +57,7 @@ class Yahtzee:
         self.round = 0
         self.rerolls = MAX_REROLLS
         self.scoresheet = np.full(NUM_CATEGORIES, EMPTY, dtype=np.uint8)
+        self.filled_mask = 0
         self.log = np.empty((NUM_CATEGORIES, 3), dtype=object)
         self.roll_dice(np.array([False, False, False, False, False]))
         
@@ -88,9 +97,12 @@ class Yahtzee:
         
         # Randomly choose numbers for dice roll.
         # TRUE MEANS TO KEEP; FALSE MEANS TO REROLL
-        for i, choose in enumerate(indices[:5]):
-            if not choose:
-                self.dice[i] = PRNG.choice(DIE_CHOICES)
+        indices = indices[:NUM_DICE]
+        if type(indices) == np.ndarray:
+            indices = indices.tolist()
+        rerolled = [i for i, choose in enumerate(indices) if not choose]
+        for i, face in zip(rerolled, self.dice_stream.draw(len(rerolled))):
+            self.dice[i] = face
         
         # Logging result of dice roll.
         if self.log[self.round, 2] == None:
@@ -198,6 +210,7 @@ class Yahtzee:
             score = scoring(dice)
         # Write in the score.
         self.scoresheet[category] = score
+        self.filled_mask |= 1 << category
         self.log[self.round, 0] = CATEGORIES_NAMES[category]
         self.log[self.round, 1] = score
 
@@ -232,6 +245,7 @@ class Yahtzee:
         self.rerolls = MAX_REROLLS - 1
         self.dice = initial_roll
         self.scoresheet[prev_write] = EMPTY
+        self.filled_mask &= ~(1 << prev_write)
         self.log[prev_round] = [None, None, None]
 
 
@@ -0,0 +1,114 @@
+from Yahtzee import Yahtzee, ALL_CATEGORIES_MASK, BONUS_THRESHOLD, dice_index
+from FullGameSolver import RULESET, solve_full_game, turn_values, category_values
+from DiceTransitions import KEEP_INDEX
+from OptimalAgent import OptimalAgent
+import ValueTable
+import argparse
+import os
+import tempfile
+import numpy as np
+
+## Compares the storage precisions of ValueTable.PRECISIONS on the full game value table.
+##
+## Every precision is saved, loaded back, and used by an OptimalAgent on the same seeded games.
+## Decisions are compared along the games played with the reference (float64) table: at every decision
+## of the reference agent, the agents of the other precisions are asked for theirs on the same position,
+## and a different decision costs its loss of expected score under the reference table (0 for ties).
+
+
+class ComparingAgent(OptimalAgent):
+    ## Plays with the reference table, and counts the decisions on which the other agents disagree
+    def __init__(self, game, value_table, others, *args, **kwargs):
+        super().__init__(game, value_table, *args, **kwargs)
+        self.others = {name: OptimalAgent(game, table) for name, table in others.items()}
+        self.n_decisions = 0
+        self.n_differences = dict.fromkeys(others, 0)
+        self.losses = dict.fromkeys(others, 0.0)
+
+    def get_action(self, dice, rerolls, available_categories):
+        action = super().get_action(dice, rerolls, available_categories)
+        self.n_decisions += 1
+        for name, agent in self.others.items():
+            other_action = agent.get_action(dice, rerolls, available_categories)
+            if other_action != action:
+                self.n_differences[name] += 1
+                self.losses[name] += (self.action_value(dice, rerolls, action)
+                                      - self.action_value(dice, rerolls, other_action))
+        return action
+
+    def action_value(self, dice, rerolls, action):
+        ## Expected final score of an action under the reference table, from the start of the turn's score
+        available_mask = self.game.get_available_mask()
+        upper_score = [min(self.game.get_upper_score(), BONUS_THRESHOLD)]
+        if action[0] == 'KEEP':
+            return category_values(self.value_table, available_mask, upper_score)[action[1], dice_index(dice), 0]
+        _, keep_values = turn_values(self.value_table, available_mask, upper_score)
+        kept = tuple(sorted(die for die, is_kept in zip(dice.tolist(), action[1]) if is_kept))
+        return keep_values[rerolls - 1][KEEP_INDEX[kept], 0]
+
+
+def compare_precisions(reference, n_games, seed, directory):
+    tables = {}
+    report = {}
+    for name, (dtype, quantize) in ValueTable.PRECISIONS.items():
+        path = os.path.join(directory, f'{name}.bin')
+        ValueTable.save_value_table(path, reference, RULESET, dtype = dtype, quantize = quantize)
+        tables[name] = ValueTable.load_value_table(path, RULESET)
+        report[name] = {
+            'size_mb': os.path.getsize(path) / 2 ** 20,
+            'max_error': np.abs(np.asarray(tables[name], dtype = np.float64) - reference).max(),
+            'start_value': float(tables[name][ALL_CATEGORIES_MASK, 0]),
+        }
+
+    seeds = range(seed, seed + n_games)
+    scores = {name: np.array([OptimalAgent(Yahtzee(log_mode = 'none', seed = game_seed), table).play_game()
+                              for game_seed in seeds])
+              for name, table in tables.items()}
+
+    n_decisions = 0
+    n_differences = dict.fromkeys(tables, 0)
+    losses = dict.fromkeys(tables, 0.0)
+    for game_seed in seeds:
+        agent = ComparingAgent(Yahtzee(log_mode = 'none', seed = game_seed), reference, tables)
+        agent.play_game()
+        n_decisions += agent.n_decisions
+        for name in tables:
+            n_differences[name] += agent.n_differences[name]
+            losses[name] += agent.losses[name]
+
+    reference_scores = scores['float64']
+    for name in tables:
+        ## Games use the same seeds, so the score difference is measured game by game
+        differences = scores[name] - reference_scores
+        report[name].update({
+            'mean_score': scores[name].mean(),
+            'score_change': differences.mean(),
+            'score_change_error': differences.std() / np.sqrt(n_games),
+            'decision_differences': n_differences[name],
+            'decisions': n_decisions,
+            'loss_per_game': losses[name] / n_games,
+        })
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Compares the storage precisions of the full game value table.")
+    parser.add_argument('--table', default = None, help = "reference value table file (solved in float64 if not given)")
+    parser.add_argument('--games', type = int, default = 200, help = "number of seeded games to replay")
+    parser.add_argument('--seed', type = int, default = 0, help = "seed of the first game")
+    args = parser.parse_args()
+
+    if args.table is None:
+        reference = solve_full_game(verbose = False)
+    else:
+        reference = np.asarray(ValueTable.load_value_table(args.table, RULESET), dtype = np.float64)
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = compare_precisions(reference, args.games, args.seed, directory)
+
+    print(f"{'precision':<12} {'size (MB)':>9} {'max error':>10} {'start value':>12} {'mean score':>10}"
+          f" {'change':>16} {'different decisions':>20} {'loss per game':>14}")
+    for name, row in report.items():
+        print(f"{name:<12} {row['size_mb']:>9.2f} {row['max_error']:>10.2e} {row['start_value']:>12.4f}"
+              f" {row['mean_score']:>10.2f} {row['score_change']:>+8.3f} ± {row['score_change_error']:<5.3f}"
+              f" {row['decision_differences']:>8} / {row['decisions']:<9} {row['loss_per_game']:>14.2e}")
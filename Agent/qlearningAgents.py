@@ -12,6 +12,7 @@
 # Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 from learningAgents import ReinforcementAgent
+from QTable import QTable, encode_state, encode_action, decode_action
 
 import random,Util,math
 import copy
@@ -35,7 +36,8 @@ class QLearningAgent(ReinforcementAgent):
     """
     def __init__(self, **args):
         ReinforcementAgent.__init__(self, **args)
-        self.qValues = Util.Counter()
+        # Q-values are stored by encoded state and action id, with canonical rerolls (see QTable.py)
+        self.qValues = QTable()
 
     def getQValue(self, state, action):
         """
@@ -43,7 +45,7 @@ class QLearningAgent(ReinforcementAgent):
           Should return 0.0 if we have never seen a state
           or the Q node value otherwise
         """
-        return self.qValues[state, action]
+        return self.qValues.get(encode_state(state), encode_action(action, state[0]))
 
     def computeValueFromQValues(self, state):
         """
@@ -52,15 +54,10 @@ class QLearningAgent(ReinforcementAgent):
           there are no legal actions, which is the case at the
           terminal state, you should return a value of 0.0.
         """
-        mx = float('-inf')
-        for action in self.getLegalActions(state):
-          qValue = self.getQValue(state, action)
-          if qValue > mx:
-            mx = qValue
-
-        if mx == float('-inf'):
+        best = self.getBest(state)
+        if best is None:
           return 0.0
-        return mx
+        return best[0]
 
     def computeActionFromQValues(self, state):
         """
@@ -68,16 +65,34 @@ class QLearningAgent(ReinforcementAgent):
           are no legal actions, which is the case at the terminal state,
           you should return None.
         """
-        "*** YOUR CODE HERE ***"        
-        mx = float('-inf')
-        bestAction = None
-        for action in self.getLegalActions(state):
-          qValue = self.getQValue(state, action)
-          if qValue > mx:
-            mx = qValue
-            bestAction = action
-        
-        return bestAction
+        best = self.getBest(state)
+        if best is None:
+          return None
+        return decode_action(best[1], state[0])
+
+    def getBest(self, state):
+        """
+          Returns (max Q-value, id of the first legal action with it) of a state,
+          or None if there are no legal actions.
+          The best of a state is cached by the Q-table and kept up to date by update(),
+          so the legal actions are only scanned again when the max of a state decreases.
+        """
+        row = self.qValues.find(encode_state(state))
+        best = self.qValues.get_best(row) if row >= 0 else None
+        if best is not None:
+          return best
+
+        legalActions = self.getLegalActions(state)
+        if len(legalActions) == 0:
+          return None
+        if row < 0:
+          # Unvisited state (reads do not insert it): every Q-value is 0, the first legal action is the best
+          return (0.0, encode_action(legalActions[0], state[0]))
+        qValues = self.qValues.values[row]
+        best = max((qValues[actionId], -actionId) for actionId in (encode_action(action, state[0]) for action in legalActions))
+        best = (float(best[0]), -best[1])
+        self.qValues.set_best(row, *best)
+        return best
 
     def get_action(self, state):
         """
@@ -90,13 +105,12 @@ class QLearningAgent(ReinforcementAgent):
           HINT: To pick randomly from a list, use random.choice(list)
         """
         # Pick Action
-        legalActions = self.getLegalActions(state)
-        action = None
-        if (len(legalActions) == 0):
-          return None
-        
+        # Legal actions are only listed to explore: the greedy action is cached (see getBest)
         yes = Util.flipCoin(self.epsilon)
         if yes:
+          legalActions = self.getLegalActions(state)
+          if (len(legalActions) == 0):
+            return None
           action = random.choice(legalActions)
         else:
           action = self.computeActionFromQValues(state)
@@ -111,7 +125,8 @@ class QLearningAgent(ReinforcementAgent):
           it will be called on your behalf
         """
         val = reward + self.discount * self.computeValueFromQValues(nextState)
-        self.qValues[state, action] = (1 - self.alpha) * self.getQValue(state, action) + self.alpha * val
+        stateCode, actionId = encode_state(state), encode_action(action, state[0])
+        self.qValues.set(stateCode, actionId, (1 - self.alpha) * self.qValues.get(stateCode, actionId) + self.alpha * val)
 
     def getPolicy(self, state):
         return self.computeActionFromQValues(state)
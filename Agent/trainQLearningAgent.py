@@ -1,10 +1,24 @@
 from Yahtzee import Yahtzee, CATEGORIES_NAMES
 from qlearningAgents import QLearningAgent
+from QTable import QTable, reroll_actions
+from SolverProgress import save_checkpoint, load_checkpoint
 from typing import List, Literal, Union, Tuple
+from concurrent.futures import ProcessPoolExecutor
 from itertools import product
+import math
+import os
+import random
+import time
+import numpy as np
+
+try:
+    from tqdm import tqdm
+except ImportError:  # progress bars are optional
+    tqdm = None
 
-all_rewards = [0]
-all_scoreboards = []
+GRID_WINDOW = 100  # episodes of the last window mean of grid search summaries
+HALVING_MIN_EPISODES = 100  # episodes of every configuration in the first rung of successive halving
+HALVING_ETA = 3  # successive halving keeps the best 1/eta configurations, and trains them eta times longer
 
 # State: Tuple(dice: list, rerolls: int, available_categories: list)
 def actionFn(state) -> Tuple[Literal['REROLL', 'KEEP'], Union[List[bool], int]]:
@@ -15,9 +29,8 @@ def actionFn(state) -> Tuple[Literal['REROLL', 'KEEP'], Union[List[bool], int]]:
     
     # If have more than 0 rerolls, we gain access to REROLL action
     if state[1] > 0:
-      # We have 2^6 possible actions
-      for permutation in list(product([True, False], repeat=6)):
-        legalActions.append(("REROLL", permutation))
+      # One action per distinct multiset of dice to keep (at most 31, against 2^6 masks)
+      legalActions.extend(reroll_actions(state[0]))
             
     # KEEP action has to choose a category
     for category in state[2]:
@@ -41,9 +54,6 @@ def runEpisode(agent: QLearningAgent, environment: Yahtzee, discount, episode, v
         # END IF IN A TERMINAL STATE
         actions = actionFn(state)
         if len(actions) == 0:
-            if returns > all_rewards[-1]:
-                all_scoreboards.append(environment.get_scoresheet())
-                all_rewards.append(returns)
             if verbose > 1:
                 print("EPISODE "+str(episode)+" COMPLETE: RETURN WAS "+str(returns)+"\n")
             return returns
@@ -66,60 +76,206 @@ def runEpisode(agent: QLearningAgent, environment: Yahtzee, discount, episode, v
 
         returns += reward * totalDiscount
         totalDiscount *= discount
-        
-from tqdm import tqdm
-def train_Yahtzee(episodes = 10, lr=0.5, eps=0.3, discount=1):
-    print(f"Starting to train with lr={lr} eps={eps}")
-    qLearnOpts = {
-      'actionFn': actionFn,
-      'gamma': discount,
-      'alpha': lr,
-      'epsilon': eps
-    }
-    agent = QLearningAgent(**qLearnOpts)
-    env = Yahtzee()
+
+def config_name(lr, eps):
+    return f"lr={lr}_eps={eps}"
+
+def train_Yahtzee(episodes = 10, lr=0.5, eps=0.3, discount=1, seed=None, output_dir='.', verbose=True,
+                  agent=None, returns=None, best_returns=None, best_scoreboards=None):
+    """
+    Trains a Q-learning agent with the given hyperparameters up to the given total number of episodes,
+    and returns its return on every episode.
+    seed seeds both the dice and the exploration of the agent, so that a configuration is reproducible.
+    A run is resumed by passing its agent, its returns, and the returns and scoresheets of its episodes that beat
+    the best return so far: these lists are extended in place.
+    The returns and the scoresheets are written to lr=..._eps=..._returns.txt and lr=..._eps=..._scores.txt in output_dir.
+    """
+    if verbose:
+        print(f"Starting to train with lr={lr} eps={eps}")
+    random.seed(seed)
+    if agent is None:
+        qLearnOpts = {
+          'actionFn': actionFn,
+          'gamma': discount,
+          'alpha': lr,
+          'epsilon': eps
+        }
+        agent = QLearningAgent(**qLearnOpts)
+    env = Yahtzee(seed=seed)
+    all_returns = [] if returns is None else returns
+    best_returns = [] if best_returns is None else best_returns
+    best_scoreboards = [] if best_scoreboards is None else best_scoreboards
     # RUN EPISODES
-    if episodes > 0:
+    if episodes > len(all_returns) and verbose:
         print()
-        print("RUNNING", episodes, "EPISODES")
+        print("RUNNING", episodes - len(all_returns), "EPISODES")
         print()
-    returns = 0
-    all_returns = []
-    for episode in tqdm(range(1, episodes+1), desc="Training", unit="Episode"):
+    episode_range = range(len(all_returns) + 1, episodes+1)
+    if verbose and tqdm is not None:
+        episode_range = tqdm(episode_range, desc="Training", unit="Episode")
+    for episode in episode_range:
         _return = runEpisode(agent, env, discount, episode)
-        returns += _return
         all_returns.append(_return)
-    if episodes > 0:
-        print()
-        print("AVERAGE RETURNS FROM START STATE: "+str((returns+0.0) / episodes))
+        if _return > (best_returns[-1] if best_returns else 0):
+            best_returns.append(_return)
+            best_scoreboards.append(env.get_scoresheet().copy())
+    if episodes > 0 and verbose:
         print()
+        print("AVERAGE RETURNS FROM START STATE: "+str(sum(all_returns) / len(all_returns)))
+        print("STATES VISITED: "+str(len(agent.qValues)))
         print()
 
-    # DISPLAY POST-LEARNING VALUES / Q-VALUES
-    import json
-    if agent.get_agent_name() == 'Q-Learning Agent':
-        print("Q-VALUES AFTER "+str(episodes)+" EPISODES")
-        # sortedQValues = sorted(agent.qValues.items(), key=lambda x: x[1], reverse=True)[:10]
-        # for qValue in sortedQValues:
-        #   cats = [CATEGORIES_NAMES[int(x)] for x in qValue[0][0][2]]
-        #   print(f"State: Dice Values: {qValue[0][0][0]}, Rerolls: {qValue[0][0][1]}, Available Categories: {cats}, Action: {qValue[0][1][0]}, {CATEGORIES_NAMES[int(qValue[0][1][1])]} \nValue: {qValue[1]}")
-        print(len(agent.qValues))
-        
-        with open("scores.txt", 'w') as f:
-            for id, reward in enumerate(all_rewards[1:]):
-                f.write(f"{reward}, {all_scoreboards[id]}\n")
-        with open(f"lr={lr}_eps={eps}_returns.txt", 'w') as f:
-            for id, reward in enumerate(all_returns):
-                f.write(f"{reward} \n")
-        print("VALUES AFTER "+str(episodes)+" EPISODES")
+    name = config_name(lr, eps)
+    with open(os.path.join(output_dir, f"{name}_scores.txt"), 'w') as f:
+        for reward, scoreboard in zip(best_returns, best_scoreboards):
+            f.write(f"{reward}, {scoreboard}\n")
+    with open(os.path.join(output_dir, f"{name}_returns.txt"), 'w') as f:
+        for reward in all_returns:
+            f.write(f"{reward} \n")
+    return all_returns
 
-import time
-start_time = time.time()
-
-# Grid search
-lrs = [x/10 for x in range(1,11)]
-eps = [x/10 for x in range(1,6)]
-for lr in lrs:
-    for ep in eps:
-        train_Yahtzee(1000, lr=lr, eps=ep)
-print("Time Taken:", time.time() - start_time)
\ No newline at end of file
+def summarize(lr, eps, seed, returns, window, elapsed):
+    # Summary row of a configuration, see grid_search
+    return {
+      'lr': lr,
+      'eps': eps,
+      'seed': seed,
+      'mean': float(np.mean(returns)),
+      'last_window': float(np.mean(returns[-window:])),
+      'episodes': len(returns),
+      'best': max(returns),
+      'time': elapsed,
+    }
+
+def _train_config(config):
+    # Runs in a worker process of grid_search: only the summary goes back, the returns are in the result files
+    lr, eps, episodes, discount, seed, output_dir, window = config
+    start_time = time.time()
+    returns = train_Yahtzee(episodes, lr=lr, eps=eps, discount=discount, seed=seed, output_dir=output_dir, verbose=False)
+    return summarize(lr, eps, seed, returns, window, time.time() - start_time)
+
+def grid_search(lrs, eps, episodes = 1000, discount=1, seed=0, workers=None, output_dir='.', window=GRID_WINDOW):
+    """
+    Trains one agent per (lr, eps) configuration, in parallel over a pool of worker processes.
+    Configurations are seeded with seed, seed + 1, ... in grid order, so results do not depend on the number of workers.
+    Returns a summary per configuration: mean return, mean return of the last window episodes, best return and time.
+    """
+    configs = [(lr, ep, episodes, discount, seed + index, output_dir, window)
+               for index, (lr, ep) in enumerate(product(lrs, eps))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        summary = []
+        for row in executor.map(_train_config, configs):
+            print(f"Done lr={row['lr']} eps={row['eps']}: mean={row['mean']:.2f} last_{window}={row['last_window']:.2f} ({row['time']:.1f}s)")
+            summary.append(row)
+    return summary
+
+def _train_rung(config):
+    # Runs in a worker process of successive_halving: trains a configuration up to a total number of episodes,
+    # resuming from the Q-table and returns checkpointed by its previous rung
+    lr, eps, episodes, discount, seed, output_dir, window = config
+    start_time = time.time()
+    name = config_name(lr, eps)
+    qtable_path = os.path.join(output_dir, f"{name}_qtable.npz")
+    progress_path = os.path.join(output_dir, f"{name}_progress.npz")
+    settings = {'lr': lr, 'eps': eps, 'discount': discount, 'seed': seed}
+    checkpoint = load_checkpoint(progress_path)
+    agent = QLearningAgent(actionFn=actionFn, gamma=discount, alpha=lr, epsilon=eps)
+    returns = []
+    best_returns = []
+    best_scoreboards = []
+    previous_time = 0.0
+    if checkpoint is not None:
+        ## Only resume runs of the same configuration, seeded the same way
+        saved_settings = {key: checkpoint[key].item() if key in checkpoint else None for key in settings}
+        if saved_settings != settings:
+            raise Exception(f"Checkpoint {progress_path} was trained with {saved_settings}, not {settings}:"
+                            " use another output directory.")
+        agent.qValues = QTable.load(qtable_path)
+        if agent.qValues is None:
+            raise Exception(f"Checkpoint {progress_path} has no Q-table {qtable_path}.")
+        returns = checkpoint['returns'].tolist()
+        best_returns = checkpoint['best_returns'].tolist()
+        best_scoreboards = list(checkpoint['best_scoreboards'])
+        previous_time = float(checkpoint['time'])
+
+    # Every rung has its own seed, so that a resumed configuration does not replay the dice of its previous rungs
+    rung_seed = int(np.random.SeedSequence([seed, len(returns)]).generate_state(1)[0])
+    train_Yahtzee(episodes, lr=lr, eps=eps, discount=discount, seed=rung_seed, output_dir=output_dir, verbose=False,
+                  agent=agent, returns=returns, best_returns=best_returns, best_scoreboards=best_scoreboards)
+
+    ## The Q-table is saved first: a progress checkpoint always has a Q-table at least as trained as its returns
+    elapsed = previous_time + time.time() - start_time
+    agent.qValues.save(qtable_path)
+    save_checkpoint(progress_path, returns=np.array(returns), best_returns=np.array(best_returns),
+                    best_scoreboards=np.array(best_scoreboards, dtype=np.uint8).reshape(len(best_scoreboards), -1),
+                    time=elapsed, **settings)
+
+    ## A configuration trained further by a previous sweep is ranked on its first episodes only,
+    ## so that a restarted sweep makes the same choices as the original one
+    return summarize(lr, eps, seed, returns[:episodes], window, elapsed)
+
+def successive_halving(lrs, eps, min_episodes = HALVING_MIN_EPISODES, max_episodes = 1000, eta = HALVING_ETA,
+                       discount=1, seed=0, workers=None, output_dir='.', window=GRID_WINDOW):
+    """
+    Successive halving over the (lr, eps) grid: every configuration is trained for min_episodes, then only the
+    best 1/eta of them (by the mean return of their last window episodes) are trained on, up to eta times as many
+    episodes, until max_episodes or a single configuration is left.
+    Survivors resume from the Q-table checkpointed in output_dir by their previous rung, and so does a sweep
+    restarted with the same output_dir and settings (checkpoints of another seed or discount raise an exception).
+    Returns the summary of every configuration at the last rung it reached (see grid_search).
+    """
+    configs = [(lr, ep, seed + index) for index, (lr, ep) in enumerate(product(lrs, eps))]
+    summary = {}
+    episodes = min(min_episodes, max_episodes)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            rung = [(lr, ep, episodes, discount, config_seed, output_dir, window) for lr, ep, config_seed in configs]
+            rows = list(executor.map(_train_rung, rung))
+            for config, row in zip(configs, rows):
+                summary[config] = row
+            ranked = sorted(range(len(configs)), key=lambda index: rows[index]['last_window'], reverse=True)
+            print(f"Rung of {episodes} episodes: {len(configs)} configurations, best lr={rows[ranked[0]]['lr']}"
+                  f" eps={rows[ranked[0]]['eps']} last_{window}={rows[ranked[0]]['last_window']:.2f}")
+            if episodes >= max_episodes or len(configs) == 1:
+                break
+            configs = [configs[index] for index in ranked[:math.ceil(len(configs) / eta)]]
+            episodes = min(episodes * eta, max_episodes)
+    return list(summary.values())
+
+def write_summary(summary, path, window=GRID_WINDOW):
+    # One row per configuration, the longest trained first, then best last window mean first
+    with open(path, 'w') as f:
+        f.write(f"{'lr':>5} {'eps':>5} {'seed':>6} {'episodes':>8} {'mean':>8} {f'last_{window}':>9} {'best':>6} {'time_s':>8}\n")
+        for row in sorted(summary, key=lambda row: (row['episodes'], row['last_window']), reverse=True):
+            f.write(f"{row['lr']:>5} {row['eps']:>5} {row['seed']:>6} {row['episodes']:>8} {row['mean']:>8.2f}"
+                    f" {row['last_window']:>9.2f} {row['best']:>6} {row['time']:>8.1f}\n")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Grid search of the learning rate and epsilon of the Q-learning agent.")
+    parser.add_argument('--episodes', type = int, default = 1000, help = "episodes per configuration")
+    parser.add_argument('--workers', type = int, default = None, help = "worker processes (number of CPUs if not given)")
+    parser.add_argument('--seed', type = int, default = 0, help = "seed of the first configuration")
+    parser.add_argument('--window', type = int, default = GRID_WINDOW, help = "episodes of the last window mean")
+    parser.add_argument('--output-dir', default = '.', help = "directory of the result files")
+    parser.add_argument('--halving', action = 'store_true',
+                        help = "successive halving: stop the worst configurations early, --episodes is then the maximum")
+    parser.add_argument('--min-episodes', type = int, default = HALVING_MIN_EPISODES, help = "episodes of the first halving rung")
+    parser.add_argument('--eta', type = int, default = HALVING_ETA, help = "halving keeps the best 1/eta configurations per rung")
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    # Grid search
+    lrs = [x/10 for x in range(1,11)]
+    eps = [x/10 for x in range(1,6)]
+    os.makedirs(args.output_dir, exist_ok = True)
+    if args.halving:
+        summary = successive_halving(lrs, eps, args.min_episodes, args.episodes, args.eta, seed=args.seed,
+                                     workers=args.workers, output_dir=args.output_dir, window=args.window)
+    else:
+        summary = grid_search(lrs, eps, args.episodes, seed=args.seed, workers=args.workers,
+                              output_dir=args.output_dir, window=args.window)
+    write_summary(summary, os.path.join(args.output_dir, "grid_summary.txt"), args.window)
+    print("Time Taken:", time.time() - start_time)
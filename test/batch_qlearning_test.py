@@ -0,0 +1,43 @@
+import sys
+import os
+
+module_path = os.path.join(os.path.dirname(__file__), '..', 'Agent')
+
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import unittest
+import numpy as np
+import BatchQLearning
+import QTable
+from Yahtzee import DICE_COMBINATIONS
+
+class TestBatchQLearning(unittest.TestCase):
+
+    def test_reroll_ids(self):
+        for roll, dice in enumerate(DICE_COMBINATIONS):
+            legal_ids = np.nonzero(BatchQLearning.REROLL_LEGAL[roll])[0].tolist()
+            actions = [('REROLL', tuple(BatchQLearning.REROLL_KEEP_MASKS[roll, action_id].tolist())) for action_id in legal_ids]
+            self.assertEqual(actions, QTable.reroll_actions(dice))
+            self.assertEqual([QTable.encode_action(action, dice) for action in actions], legal_ids)
+
+    def test_returns_match_scores(self):
+        learner = BatchQLearning.BatchQLearner(num_envs=64, seed=4246)
+        n_episodes = 0
+        for _ in range(200):
+            self.assertTrue(learner.legal_actions().any(axis=1).all())
+            n_episodes += len(learner.step())
+            ## Returns so far are the scores written, bonus included
+            np.testing.assert_array_equal(learner.returns, learner.envs.calculate_score())
+        ## A game lasts at most 13 rounds of 3 transitions
+        self.assertGreaterEqual(n_episodes, 64 * (200 // 39))
+        self.assertGreater(len(learner.qValues), 0)
+
+    def test_train(self):
+        learner = BatchQLearning.BatchQLearner(num_envs=32, seed=0)
+        returns = learner.train(100)
+        self.assertEqual(len(returns), 100)
+        self.assertTrue(((returns >= 0) & (returns <= 375)).all())
+
+if __name__ == '__main__':
+    unittest.main()
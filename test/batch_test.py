@@ -0,0 +1,81 @@
+import importlib
+import sys
+import os
+
+module_path = os.path.join(os.path.dirname(__file__), '..')
+
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+imported_modules = [
+    importlib.import_module("Agent.Yahtzee")
+]
+for imported_module in imported_modules:
+    importlib.reload(imported_module)
+
+import unittest
+import numpy as np
+from Agent import Yahtzee
+
+NUM_GAMES = 200
+
+class TestYahtzeeBatch(unittest.TestCase):
+
+    def test_matches_single_game(self):
+        rng = np.random.default_rng(4246)
+        batch = Yahtzee.YahtzeeBatch(NUM_GAMES, seed=4246)
+        games = [Yahtzee.Yahtzee() for _ in range(NUM_GAMES)]
+        for game, dice in zip(games, batch.dice):
+            game.dice = dice.copy()
+
+        while not np.all(batch.is_over()):
+            for _ in range(rng.integers(0, Yahtzee.MAX_REROLLS)):
+                batch.roll_dice(rng.random((NUM_GAMES, Yahtzee.NUM_DICE)) < 0.5)
+            for game, dice, rerolls in zip(games, batch.dice, batch.rerolls):
+                game.dice = dice.copy()
+                game.rerolls = int(rerolls)
+            np.testing.assert_array_equal(batch.potential_score(),
+                                          [game.potential_score() for game in games])
+            np.testing.assert_array_equal(batch.encoded_states(),
+                                          [game.getEncodedState() for game in games])
+
+            available = batch.get_available_categories()
+            categories = np.argmax(rng.random(available.shape) * available, axis=1)
+            rewards = batch.getScore(categories)
+            final_scores = batch.write_score(categories)
+            for i, game in enumerate(games):
+                self.assertEqual(rewards[i], game.getScore(categories[i]))
+                self.assertEqual(final_scores[i], game.write_score(categories[i]))
+                game.dice = batch.dice[i].copy()
+
+        for i, game in enumerate(games):
+            np.testing.assert_array_equal(batch.scoresheet[i], game.scoresheet)
+            self.assertEqual(batch.calculate_score()[i], game.calculate_score())
+
+    def test_bonus(self):
+        # Random play never reaches the bonus: fill the upper section with Yahtzees instead.
+        batch = Yahtzee.YahtzeeBatch(2, seed=0)
+        game = Yahtzee.Yahtzee()
+        for category in range(Yahtzee.NUM_UPPER):
+            batch.dice[:] = category + 1
+            game.dice = batch.dice[0].copy()
+            self.assertEqual(batch.getScore(np.full(2, category))[0], game.getScore(category))
+            batch.write_score(np.full(2, category))
+            game.write_score(category)
+            np.testing.assert_array_equal(batch.scoresheet[0], game.scoresheet)
+        self.assertEqual(game.scoresheet[-1], Yahtzee.BONUS_SCORE)
+        np.testing.assert_array_equal(batch.scoresheet[1], game.scoresheet)
+        self.assertEqual(batch.calculate_score()[0], game.calculate_score())
+
+    def test_game_over(self):
+        batch = Yahtzee.YahtzeeBatch(3, seed=0)
+        for category in range(Yahtzee.NUM_CATEGORIES - 1):
+            batch.write_score(np.full(3, category))
+        self.assertTrue(np.all(batch.is_over()))
+        with self.assertRaises(Exception):
+            batch.roll_dice(np.zeros((3, Yahtzee.NUM_DICE), dtype=bool), np.ones(3, dtype=bool))
+        batch.reset(np.array([True, False, False]))
+        np.testing.assert_array_equal(batch.is_over(), [False, True, True])
+
+if __name__ == '__main__':
+    unittest.main()
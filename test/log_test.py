@@ -0,0 +1,88 @@
+import importlib
+import sys
+import os
+
+module_path = os.path.join(os.path.dirname(__file__), '..')
+
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+imported_modules = [
+    importlib.import_module("Agent.Yahtzee")
+]
+for imported_module in imported_modules:
+    importlib.reload(imported_module)
+
+import unittest
+import tempfile
+import numpy as np
+from Agent import Yahtzee
+
+
+def play(game, rerolls_per_round=2):
+    while game.get_round() < Yahtzee.NUM_CATEGORIES - 1:
+        for _ in range(rerolls_per_round):
+            game.roll_dice(game.get_dice() >= 4)
+        game.write_score(game.get_available_categories()[-1])
+    return game
+
+
+class TestGameLog(unittest.TestCase):
+
+    def test_object_log_history(self):
+        game = Yahtzee.Yahtzee()
+        game.roll_dice(np.array([True, True, False, False, False]))
+        rolls = game.log[0, 2]
+        self.assertEqual(len(rolls), 2)
+        self.assertIsNot(rolls[0], rolls[1])
+        np.testing.assert_array_equal(rolls[1], game.get_dice())
+
+    def test_no_log(self):
+        game = play(Yahtzee.Yahtzee(log_mode='none'))
+        self.assertIsNone(game.log)
+        with self.assertRaises(Exception):
+            game.undo_round()
+
+    def test_binary_replay(self):
+        game = play(Yahtzee.Yahtzee(log_mode='binary'))
+        replayed = Yahtzee.Yahtzee.replay(game.get_binary_log())
+        np.testing.assert_array_equal(replayed.get_scoresheet()[:-1], game.get_scoresheet()[:-1])
+        self.assertEqual(replayed.calculate_score(), game.calculate_score())
+
+        # Replay half a game, stopped after a reroll.
+        game = Yahtzee.Yahtzee(log_mode='binary')
+        for category in range(6):
+            game.roll_dice(game.get_dice() == 6)
+            game.write_score(category)
+        game.roll_dice(game.get_dice() == 6)
+        replayed = Yahtzee.Yahtzee.replay(game.get_binary_log(), log_mode='binary')
+        self.assertEqual(replayed.getEncodedState(), game.getEncodedState())
+        np.testing.assert_array_equal(replayed.get_binary_log(), game.get_binary_log())
+
+    def test_binary_undo(self):
+        game = Yahtzee.Yahtzee(log_mode='binary')
+        history = []
+        for category in range(Yahtzee.NUM_CATEGORIES - 1):
+            history.append((game.get_dice().copy(), game.get_binary_log()))
+            game.roll_dice(np.array([True, True, True, False, False]))
+            game.write_score(category, np.array([category % 6 + 1] * 5))
+
+        for dice, binary_log in reversed(history):
+            game.undo_round()
+            np.testing.assert_array_equal(game.get_dice(), dice)
+            np.testing.assert_array_equal(game.get_binary_log(), binary_log)
+            self.assertEqual(game.get_available_mask() >> game.get_round(), 2 ** (13 - game.get_round()) - 1)
+            self.assertEqual(game.get_rerolls(), Yahtzee.MAX_REROLLS - 1)
+        self.assertEqual(game.calculate_score(), 0)
+
+    def test_save_load(self):
+        logs = [play(Yahtzee.Yahtzee(log_mode='binary')).get_binary_log() for _ in range(5)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'logs.npy')
+            Yahtzee.save_binary_logs(path, logs)
+            loaded = Yahtzee.load_binary_logs(path)
+            self.assertEqual(loaded.shape, (5, Yahtzee.BINARY_LOG_RECORDS, Yahtzee.BINARY_LOG_RECORD_SIZE))
+            np.testing.assert_array_equal(loaded[3], logs[3])
+
+if __name__ == '__main__':
+    unittest.main()
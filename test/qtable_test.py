@@ -0,0 +1,114 @@
+import sys
+import os
+
+module_path = os.path.join(os.path.dirname(__file__), '..', 'Agent')
+
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import unittest
+import tempfile
+import numpy as np
+import QTable
+from itertools import product
+
+class TestQTable(unittest.TestCase):
+
+    def test_matches_dict(self):
+        rng = np.random.default_rng(4246)
+        table = QTable.QTable(rows=16)
+        expected = {}
+        for _ in range(5000):
+            state = (tuple(rng.integers(1, 7, 5).tolist()), int(rng.integers(0, 3)),
+                     tuple(sorted(rng.choice(13, int(rng.integers(1, 14)), replace=False).tolist())))
+            code = QTable.encode_state(state)
+            action = int(rng.integers(QTable.N_ACTIONS))
+            value = float(rng.random())
+            table.set(code, action, value)
+            expected[code, action] = value
+        for (code, action), value in expected.items():
+            self.assertEqual(table.get(code, action), value)
+        self.assertEqual(len(table), len({code for code, _ in expected}))
+        # Unvisited states read as 0 without being inserted.
+        self.assertEqual(table.get(-5, 0), 0.0)
+        self.assertEqual(len(table), len({code for code, _ in expected}))
+
+    def test_action_ids(self):
+        masks = list(product([True, False], repeat=6))
+        for dice in [(1, 2, 3, 4, 5), (6, 6, 1, 6, 1), (3, 3, 3, 3, 3)]:
+            canonical = QTable.reroll_actions(dice)
+            ids = [QTable.encode_action(action, dice) for action in canonical]
+            # One reroll per distinct kept multiset, in id order, without keeping every die.
+            kept = {tuple(sorted(die for die, keep in zip(dice, mask) if keep)) for mask in masks}
+            self.assertEqual(len(canonical), len(kept) - 1)
+            self.assertEqual(ids, sorted(ids))
+            for action, action_id in zip(canonical, ids):
+                self.assertEqual(QTable.decode_action(action_id, dice), action)
+            # Every 6-bit mask maps to the id of the canonical action keeping the same faces.
+            for mask in masks:
+                action_id = QTable.encode_action(('REROLL', mask), dice)
+                self.assertLess(action_id, QTable.N_REROLL_ACTIONS)
+                decoded = QTable.decode_action(action_id, dice)[1]
+                self.assertEqual(sorted(d for d, k in zip(dice, decoded) if k), sorted(d for d, k in zip(dice, mask) if k))
+            keeps = [QTable.encode_action(('KEEP', c), dice) for c in range(13)]
+            self.assertEqual(keeps, list(range(QTable.KEEP_ACTION, QTable.N_ACTIONS)))
+
+    def test_vectorized_lookups(self):
+        rng = np.random.default_rng(11)
+        table = QTable.QTable(rows=16)
+        initial_codes = rng.integers(1 << 24, size=50).tolist()
+        for code in initial_codes:
+            table.set(code, 0, float(code))
+        codes = rng.integers(1 << 24, size=(40, 25))
+        codes[:, 0] = codes[0, 0]  # duplicates of a new state
+        rows = table.insert_many(codes)
+        self.assertEqual(rows.shape, codes.shape)
+        for code, row in zip(codes.ravel().tolist(), rows.ravel().tolist()):
+            self.assertEqual(table.insert(code), row)
+        np.testing.assert_array_equal(table.find_many(codes), rows)
+        self.assertEqual(table.find_many([1 << 30]).tolist(), [-1])
+        self.assertEqual(len(table), len(set(codes.ravel().tolist()) | set(initial_codes)))
+        for code in initial_codes:
+            self.assertEqual(table.get(code, 0), float(code))
+
+    def test_cached_best(self):
+        rng = np.random.default_rng(3)
+        table = QTable.QTable(rows=16)
+        legal = [0, 3, 5, QTable.KEEP_ACTION, QTable.KEEP_ACTION + 7]
+        n_rescans = 0
+        for code in range(20):
+            row = table.insert(code)
+            for _ in range(200):
+                best = table.get_best(row)
+                values = table.row_values(code)[legal]
+                expected = (float(values.max()), legal[int(np.argmax(values))])
+                if best is None:
+                    n_rescans += 1
+                    table.set_best(row, *expected)
+                else:
+                    self.assertEqual(best, expected)
+                ## Few distinct values, so that ties happen
+                table.set(code, legal[int(rng.integers(len(legal)))], float(rng.integers(4)))
+        self.assertLess(n_rescans, 20 * 200 // 2)
+
+    def test_save_load(self):
+        rng = np.random.default_rng(7)
+        table = QTable.QTable(rows=16)
+        for _ in range(100):
+            table.set(int(rng.integers(1 << 24)), int(rng.integers(QTable.N_ACTIONS)), float(rng.random()))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'qtable.npz')
+            self.assertIsNone(QTable.QTable.load(path))
+            table.save(path)
+            loaded = QTable.QTable.load(path)
+        self.assertEqual(len(loaded), len(table))
+        for code in table.keys[table.keys != QTable.EMPTY_KEY].tolist():
+            np.testing.assert_array_equal(loaded.row_values(code), table.row_values(code))
+        ## The loaded table keeps growing from where it was saved
+        for code in range(1 << 25, (1 << 25) + 100):
+            loaded.set(code, 0, 1.0)
+        self.assertEqual(len(loaded), len(table) + 100)
+        self.assertEqual(loaded.get(1 << 25, 0), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -121,5 +121,101 @@ class TestScoreCalculation(unittest.TestCase):
             self.assertEqual(history[turn], game.calculate_score())
             game.undo_round()
 
+    def test_incremental_upper_score(self):
+        game.reset()
+
+        def check_upper_score():
+            segment = game.scoresheet[:Yahtzee.NUM_UPPER]
+            self.assertEqual(game.get_upper_score(), np.sum(segment[segment != Yahtzee.EMPTY]))
+
+        for category in range(Yahtzee.NUM_UPPER):
+            game.dice = np.full(5, category + 1)
+            game.doAction(['KEEP', category])
+            check_upper_score()
+        for _ in range(Yahtzee.NUM_UPPER):
+            game.undo_round()
+            check_upper_score()
+
+    def test_score_table(self):
+        for combination in Yahtzee.DICE_COMBINATIONS:
+            dice = np.array(combination)
+            idx = Yahtzee.dice_index(dice[::-1])
+            self.assertEqual(Yahtzee.DICE_COMBINATIONS[idx], combination)
+            for category in range(Yahtzee.NUM_CATEGORIES - 1):
+                expected = 0
+                if Yahtzee.CATEGORIES_CHECK[category](dice):
+                    expected = Yahtzee.CATEGORIES_SCORING[category](dice)
+                self.assertEqual(Yahtzee.SCORE_TABLE[idx, category],
+                                 expected,
+                                 f'{Yahtzee.CATEGORIES_NAMES[category]} of {combination} should be {expected}')
+
+    def test_encoded_state(self):
+        game.reset()
+        game.write_score(0, np.array([1, 1, 1, 2, 2]))
+        game.write_score(7, np.array([6, 6, 6, 6, 2]))
+        dice_idx, rerolls, mask, upper = Yahtzee.decode_state(game.getEncodedState())
+        self.assertEqual(Yahtzee.DICE_COMBINATIONS[dice_idx], tuple(sorted(game.dice.tolist())))
+        self.assertEqual(rerolls, game.rerolls)
+        self.assertEqual(Yahtzee.mask_to_categories(mask), game.get_available_categories())
+        self.assertEqual(upper, 3)
+        state, reward = game.doEncodedAction(['KEEP', 12])
+        self.assertEqual(reward, game.scoresheet[12])
+        self.assertEqual(state, game.getEncodedState())
+        self.assertLess(state, Yahtzee.NUM_ENCODED_STATES)
+
+    def test_seeded_dice(self):
+        games = [Yahtzee.Yahtzee(seed=4246) for _ in range(2)]
+        for category in range(Yahtzee.NUM_CATEGORIES - 1):
+            for seeded_game in games:
+                seeded_game.roll_dice(np.array([True, False, True, False, False]))
+            np.testing.assert_array_equal(games[0].get_dice(), games[1].get_dice())
+            for seeded_game in games:
+                seeded_game.write_score(category)
+        self.assertEqual(games[0].calculate_score(), games[1].calculate_score())
+
+    def test_snapshot_restore(self):
+        game.reset()
+        game.write_score(0, np.array([1, 1, 1, 2, 2]))
+        snapshot = game.snapshot()
+        dice, scoresheet = game.dice, game.scoresheet
+        expected_dice, expected_scoresheet = dice.copy(), scoresheet.copy()
+        for category in range(1, 6):
+            game.write_score(category, np.array([category + 1] * 5))
+        self.assertEqual(game.scoresheet[13], 35)
+
+        game.restore(snapshot)
+        self.assertIs(game.dice, dice)
+        self.assertIs(game.scoresheet, scoresheet)
+        np.testing.assert_array_equal(game.dice, expected_dice)
+        np.testing.assert_array_equal(game.scoresheet, expected_scoresheet)
+        self.assertEqual((game.round, game.rerolls, game.bonus_round), (1, Yahtzee.MAX_REROLLS - 1, None))
+
+        clone = game.clone()
+        self.assertEqual(clone.snapshot(), game.snapshot())
+        clone.write_score(1)
+        self.assertEqual(clone.round, game.round + 1)
+        self.assertEqual(game.scoresheet[1], Yahtzee.EMPTY)
+
+    def test_clone_dice(self):
+        game, reference = Yahtzee.Yahtzee(seed=1), Yahtzee.Yahtzee(seed=1)
+        reroll_all = np.zeros(5, dtype=bool)
+
+        def rolls(game, n=20):
+            faces = []
+            for _ in range(n):
+                game.roll_dice(reroll_all)
+                game.rerolls = Yahtzee.MAX_REROLLS
+                faces.append(tuple(game.dice.tolist()))
+            return tuple(faces)
+
+        ## Clones roll their own dice: not the dice of the game, nor those of the other clones...
+        clones = [rolls(game.clone()) for _ in range(100)]
+        self.assertEqual(len(set(clones)), len(clones))
+        self.assertGreater(len({clone[0] for clone in clones}), 1)
+        ## ...without changing the dice the game rolls
+        game_rolls = rolls(game)
+        self.assertEqual(game_rolls, rolls(reference))
+        self.assertNotIn(game_rolls, clones)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
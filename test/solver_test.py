@@ -0,0 +1,312 @@
+import sys
+import os
+
+module_path = os.path.join(os.path.dirname(__file__), '..', 'Agent')
+
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import importlib
+import importlib.util
+import tempfile
+import unittest
+import numpy as np
+import FullGameSolver
+import DiceTransitions
+import ValueTable
+import SolverProgress
+import LazyEvaluator
+from Yahtzee import DICE_COMBINATIONS, CATEGORIES_NAMES
+
+def import_agent_module(name):
+    ## Agent modules do `from Agent import Agent`, which finds the Agent package of the repository root
+    ## instead of Agent/Agent.py: import them with Agent.py standing in for the package
+    package = sys.modules.get('Agent')
+    spec = importlib.util.spec_from_file_location('Agent', os.path.join(module_path, 'Agent.py'))
+    sys.modules['Agent'] = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(sys.modules['Agent'])
+        return importlib.import_module(name)
+    finally:
+        if package is None:
+            del sys.modules['Agent']
+        else:
+            sys.modules['Agent'] = package
+
+ValueIterationAgent = import_agent_module('ValueIterationAgent')
+PolicyAgent = import_agent_module('PolicyAgent')
+OptimalAgent = import_agent_module('OptimalAgent')
+ExpectimaxAgent = import_agent_module('ExpectimaxAgent')
+import Yahtzee
+import Yahtzee_7
+
+# Expected scores of a game with a single category left, with optimal rerolls.
+SINGLE_CATEGORY_VALUES = {
+    'Sixes': 6 * 5 * (1 - (5 / 6) ** 3),
+    'Yahtzee': 50 * 0.0460286,
+    'Chance': 5 * 14 / 3,
+}
+
+class TestFullGameSolver(unittest.TestCase):
+
+    def test_transitions(self):
+        self.assertEqual(DiceTransitions.NUM_KEEPS, 462)
+        np.testing.assert_allclose(np.add.reduceat(DiceTransitions.KEEP_ROLL_DATA,
+                                                   DiceTransitions.KEEP_ROLL_INDPTR[:-1]), 1)
+        # Holding all dice always gives back the same roll.
+        for roll, keep in enumerate(DiceTransitions.KEEP_ALL):
+            rolls, probabilities = DiceTransitions.keep_roll_probabilities(keep)
+            np.testing.assert_array_equal(rolls, [roll])
+            self.assertIn(keep, DiceTransitions.roll_keeps(roll))
+        # Sparse and dense products agree.
+        roll_values = np.arange(len(DICE_COMBINATIONS), dtype=float)
+        np.testing.assert_allclose(DiceTransitions.expected_keep_values(roll_values),
+                                   DiceTransitions.expected_keep_values(roll_values[:, None])[:, 0])
+
+    def test_single_category(self):
+        value_table = np.zeros((FullGameSolver.NUM_CATEGORY_MASKS, FullGameSolver.NUM_UPPER_SCORES))
+        for name, expected in SINGLE_CATEGORY_VALUES.items():
+            category = CATEGORIES_NAMES.index(name)
+            roll_values, _ = FullGameSolver.turn_values(value_table, 1 << category)
+            value = DiceTransitions.FIRST_ROLL @ roll_values[-1]
+            self.assertAlmostEqual(value[0], expected, places=4, msg=name)
+
+    def test_upper_bonus(self):
+        # With 50 points in the upper section, scoring at least three sixes gives the bonus.
+        value_table = np.zeros((FullGameSolver.NUM_CATEGORY_MASKS, FullGameSolver.NUM_UPPER_SCORES))
+        values = FullGameSolver.category_values(value_table, 1 << 5, np.array([50]))
+        sixes = [DICE_COMBINATIONS.index(dice) for dice in [(1, 2, 6, 6, 6), (1, 2, 3, 6, 6)]]
+        np.testing.assert_array_equal(values[5, sixes, 0], [18 + FullGameSolver.BONUS_SCORE, 12])
+
+    def test_value_table_file(self):
+        values = np.random.default_rng(0).random(ValueTable.RULESETS['yahtzee13'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.bin')
+            ValueTable.save_value_table(path, values, 'yahtzee13')
+            loaded = ValueTable.load_value_table(path, 'yahtzee13')
+            np.testing.assert_array_equal(loaded, values.astype(np.float32))
+            self.assertFalse(loaded.flags.writeable)
+            with self.assertRaises(Exception):
+                ValueTable.load_value_table(path, 'yahtzee7')
+            del loaded
+        with self.assertRaises(Exception):
+            ValueTable.save_value_table(path, values, 'yahtzee7')
+
+    def test_quantized_value_table(self):
+        values = 250 * np.random.default_rng(0).random(ValueTable.RULESETS['yahtzee13'])
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (dtype, quantize) in ValueTable.PRECISIONS.items():
+                path = os.path.join(directory, f'{name}.bin')
+                ValueTable.save_value_table(path, values, 'yahtzee13', dtype=dtype, quantize=quantize)
+                loaded = ValueTable.load_value_table(path, 'yahtzee13')
+                self.assertEqual(os.path.getsize(path), ValueTable.HEADER_SIZE + values.size * np.dtype(dtype).itemsize)
+                # Entries and rows dequantize like the whole table.
+                np.testing.assert_allclose(np.asarray(loaded), values, atol=0.125, err_msg=name)
+                np.testing.assert_array_equal(loaded[7], np.asarray(loaded)[7])
+                self.assertEqual(loaded[7, 3], np.asarray(loaded)[7, 3])
+                del loaded
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.npz')
+            self.assertIsNone(SolverProgress.load_checkpoint(path))
+            values = np.arange(12.0).reshape(3, 4)
+            SolverProgress.save_checkpoint(path, value_table = values, layers_done = 5)
+            saved = SolverProgress.load_checkpoint(path)
+            np.testing.assert_array_equal(saved['value_table'], values)
+            self.assertEqual(int(saved['layers_done']), 5)
+            self.assertEqual(os.listdir(directory), ['checkpoint.npz'])
+
+    def test_parallel_solve(self):
+        # Score tables with up to 2 categories left, solved by a process pool and serially.
+        parallel = FullGameSolver.solve_full_game(workers = 2, verbose = False, n_layers = 2)
+        serial = FullGameSolver.solve_full_game(workers = 1, verbose = False, n_layers = 2)
+        np.testing.assert_array_equal(parallel, serial)
+        self.assertGreater(serial[0b11, 0], 0)
+        self.assertEqual(serial[0b111, 0], 0)
+
+    def test_lazy_evaluator(self):
+        # Yahtzee_7 column indices of Yahtzee and Chance, with every other column filled.
+        for name, category in [('Yahtzee', 5), ('Chance', 6)]:
+            evaluator = LazyEvaluator.LazyEvaluator(cache_size=1000)
+            filled = [c for c in range(LazyEvaluator.N_CATEGORIES) if c != category]
+            value = sum(probability * evaluator.value(dice, filled, 2)
+                        for dice, probability in zip(DICE_COMBINATIONS, DiceTransitions.FIRST_ROLL))
+            self.assertAlmostEqual(value, SINGLE_CATEGORY_VALUES[name], places=4, msg=name)
+            info = evaluator.cache_info()
+            self.assertLessEqual(info['entries'], 1000)
+            self.assertGreater(info['hit_rate'], 0)
+
+class TestValueIterationAgent(unittest.TestCase):
+
+    def test_state_codes(self):
+        for code in range(ValueIterationAgent.N_STATES):
+            state = ValueIterationAgent.decode_state(code)
+            self.assertEqual(ValueIterationAgent.encode_state(state), code)
+        self.assertEqual(ValueIterationAgent.decode_state(ValueIterationAgent.encode_state(((1, 2, 2, 5, 6), (1, 0, 0, 1, 0, 0, 1), 1))),
+                         ((1, 2, 2, 5, 6), (1, 0, 0, 1, 0, 0, 1), 1))
+        self.assertEqual(list(ValueIterationAgent.state_range(5, 2)),
+                         [ValueIterationAgent.encode_state((dice, (1, 0, 1, 0, 0, 0, 0), 2)) for dice in DICE_COMBINATIONS])
+
+    def test_vectorized_backup(self):
+        ## Score tables with at most two categories left, solved state by state and table by table
+        agent = ValueIterationAgent.ValueIterationAgent(None)
+        agent.run_backward_induction(min_filled=5)
+        expected = agent.value_table
+        agent.run_vectorized_backup(min_filled=5)
+        self.assertTrue(np.allclose(agent.value_table, expected))
+        self.assertGreater(np.count_nonzero(expected), 0)
+
+    def test_policy(self):
+        agent = ValueIterationAgent.ValueIterationAgent(None)
+        agent.run_vectorized_backup()
+        agent.utilities = agent.value_table
+        policy = ValueIterationAgent.extract_policy(agent.value_table)
+        self.assertEqual(policy.dtype, np.uint16)
+        policy_agent = PolicyAgent.PolicyAgent(Yahtzee_7.Yahtzee(seed=0), policy)
+
+        def q_value(state, action):
+            return sum(probability * (ValueIterationAgent.get_reward(state, action) + agent.utilities[ValueIterationAgent.encode_state(next_state)])
+                       for next_state, probability in ValueIterationAgent.get_transition_probabilities(state, action).items())
+
+        rng = np.random.default_rng(4246)
+        for code in rng.integers(ValueIterationAgent.N_STATES, size=300).tolist():
+            state = ValueIterationAgent.decode_state(code)
+            dice, score_table, rerolls = state
+            action = policy_agent.get_action_from_state(state)
+            best_action = agent.get_action_from_state(state)
+            if best_action is None:
+                self.assertIsNone(action)
+                continue
+            ## Actions may differ on ties only
+            self.assertAlmostEqual(q_value(state, action), q_value(state, best_action))
+
+            ## get_action reads the same entry from a game in that state
+            game = Yahtzee_7.Yahtzee(seed=0)
+            game.set_state(list(dice), [idx for idx, is_filled in enumerate(score_table) if is_filled], rerolls)
+            kind, choice = PolicyAgent.PolicyAgent(game, policy).get_action(game.get_dice(), rerolls, [])
+            if action[0] == 1:
+                self.assertEqual((kind, choice), ('KEEP', action[1][0]))
+            else:
+                rerolled = sorted(die for die, keep in zip(dice, choice) if not keep)
+                self.assertEqual((kind, tuple(rerolled)), ('REROLL', action[1]))
+
+        ## Along a played game, get_action reads the entry of the game's scoresheet and sorted dice
+        game = Yahtzee_7.Yahtzee(seed=4246)
+        policy_agent = PolicyAgent.PolicyAgent(game, policy)
+        while game.get_round() < ValueIterationAgent.N_CATEGORIES:
+            dice = game.get_dice().tolist()
+            score_table = tuple(int(score != Yahtzee_7.EMPTY) for score in game.get_scoresheet().tolist())
+            action = policy_agent.get_action_from_state((tuple(sorted(dice)), score_table, game.get_rerolls()))
+            kind, choice = policy_agent.get_action(game.get_dice(), game.get_rerolls(), [])
+            if action[0] == 1:
+                self.assertEqual((kind, choice), ('KEEP', action[1][0]))
+                game.write_score(choice)
+            else:
+                rerolled = sorted(die for die, keep in zip(dice, choice) if not keep)
+                self.assertEqual((kind, tuple(rerolled)), ('REROLL', action[1]))
+                game.roll_dice(np.array(choice))
+
+    def test_checkpoint_kinds(self):
+        agent = ValueIterationAgent.ValueIterationAgent(None)
+        saved_files = []
+        agent.save_value_table = lambda *args: saved_files.append(args)
+
+        def interrupt(state, values):
+            raise KeyboardInterrupt()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.npz')
+            agent.run_backward_induction(checkpoint=path, min_filled=ValueIterationAgent.N_CATEGORIES)
+            with self.assertRaises(Exception):
+                agent.run_value_iteration(1, checkpoint=path, resume=True)
+
+            ## An interrupted sweep is checkpointed, raised again, and not saved as a solved table
+            bellman_backup = ValueIterationAgent.bellman_backup
+            ValueIterationAgent.bellman_backup = interrupt
+            try:
+                with self.assertRaises(KeyboardInterrupt):
+                    agent.run_value_iteration(1, save_to_file=True, checkpoint=path)
+            finally:
+                ValueIterationAgent.bellman_backup = bellman_backup
+            self.assertEqual(saved_files, [])
+            self.assertEqual(int(agent.load_checkpoint(path, 'value_iteration')['position']), 0)
+
+class TestExpectimaxAgent(unittest.TestCase):
+
+    N_CATEGORIES_LEFT = 3
+
+    @classmethod
+    def setUpClass(cls):
+        ## Exact values of the score tables with at most N_CATEGORIES_LEFT categories available
+        cls.value_table = np.zeros((Yahtzee.NUM_CATEGORY_MASKS, Yahtzee.NUM_UPPER_SCORES))
+        masks = sorted(range(1, Yahtzee.NUM_CATEGORY_MASKS), key=lambda mask: bin(mask).count('1'))
+        for mask in masks:
+            if bin(mask).count('1') > cls.N_CATEGORIES_LEFT:
+                break
+            cls.value_table[mask] = FullGameSolver.solve_score_table(cls.value_table, mask)
+
+    def late_game(self, seed):
+        ## Game with N_CATEGORIES_LEFT categories left, the others written with random dice
+        rng = np.random.default_rng(seed)
+        game = Yahtzee.Yahtzee(log_mode='none', seed=seed)
+        n_filled = FullGameSolver.NUM_CATEGORIES_TO_FILL - self.N_CATEGORIES_LEFT
+        for category in rng.permutation(FullGameSolver.NUM_CATEGORIES_TO_FILL)[:n_filled].tolist():
+            game.write_score(category, rng.integers(1, 7, 5))
+        return game
+
+    def action_value(self, game, dice, rerolls, action):
+        ## Expected final score of an action under the exact value table
+        available_mask = game.get_available_mask()
+        upper_score = [min(game.get_upper_score(), Yahtzee.BONUS_THRESHOLD)]
+        if action[0] == 'KEEP':
+            return FullGameSolver.category_values(self.value_table, available_mask, upper_score)[action[1], Yahtzee.dice_index(dice), 0]
+        _, keep_values = FullGameSolver.turn_values(self.value_table, available_mask, upper_score)
+        kept = tuple(sorted(die for die, is_kept in zip(dice.tolist(), action[1]) if is_kept))
+        return keep_values[rerolls - 1][DiceTransitions.KEEP_INDEX[kept], 0]
+
+    def test_matches_optimal_agent(self):
+        heuristic = ExpectimaxAgent.value_table_heuristic(self.value_table)
+        n_decisions = 0
+        for seed in range(10):
+            game = self.late_game(seed)
+            agent = ExpectimaxAgent.ExpectimaxAgent(game, heuristic, time_budget=60)
+            optimal_agent = OptimalAgent.OptimalAgent(game, self.value_table)
+            while game.round < FullGameSolver.NUM_CATEGORIES_TO_FILL:
+                dice, rerolls = game.get_dice().copy(), game.get_rerolls()
+                action = agent.get_action(dice, rerolls, [])
+                optimal_action = optimal_agent.get_action(dice, rerolls, [])
+                self.assertAlmostEqual(self.action_value(game, dice, rerolls, action),
+                                       self.action_value(game, dice, rerolls, optimal_action))
+                self.assertEqual(agent.depths[-1], (rerolls, rerolls))
+                n_decisions += 1
+                if optimal_action[0] == 'REROLL':
+                    game.roll_dice(optimal_action[1])
+                else:
+                    game.write_score(optimal_action[1])
+        self.assertGreaterEqual(n_decisions, 10 * self.N_CATEGORIES_LEFT)
+
+    def test_time_budget(self):
+        ## Without time, the search stops at its first time check, and plays like the exact search of the rerolls it finished.
+        ## Checks are made often enough to interrupt the search of two rerolls, but not of one (at most 31 chance nodes).
+        nodes_per_time_check = ExpectimaxAgent.NODES_PER_TIME_CHECK
+        ExpectimaxAgent.NODES_PER_TIME_CHECK = 32
+        try:
+            for seed in range(10):
+                game = self.late_game(seed)
+                dice = game.get_dice().copy()
+                agent = ExpectimaxAgent.ExpectimaxAgent(game, time_budget=0)
+                action = agent.get_action(dice, 2, [])
+                self.assertEqual(agent.depths, [(1, 2)])
+                expected = ExpectimaxAgent.ExpectimaxAgent(game, time_budget=60).get_action(dice, 1, [])
+                self.assertEqual(action, expected)
+                if action[0] == 'KEEP':
+                    self.assertIn(action[1], game.get_available_categories())
+                else:
+                    self.assertEqual(len(action[1]), len(dice))
+                    self.assertFalse(all(action[1]))
+        finally:
+            ExpectimaxAgent.NODES_PER_TIME_CHECK = nodes_per_time_check
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import os
+
+module_path = os.path.join(os.path.dirname(__file__), '..', 'Agent')
+
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from solver_test import import_agent_module
+
+trainQLearningAgent = import_agent_module('trainQLearningAgent')
+
+LRS = [0.2, 0.5, 1.0]
+EPS = [0.1, 0.3]
+
+def read_results(directory):
+    ## Contents of the result files of every configuration, by file name
+    results = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.txt'):
+            with open(os.path.join(directory, file_name)) as f:
+                results[file_name] = f.read()
+    return results
+
+def without_time(summary):
+    return sorted((sorted((key, value) for key, value in row.items() if key != 'time') for row in summary))
+
+class TestGridSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def output_dir(self, name):
+        path = os.path.join(self.directory.name, name)
+        os.makedirs(path)
+        return path
+
+    def run_quietly(self, function, *args, **kwargs):
+        with redirect_stdout(StringIO()):
+            return function(*args, **kwargs)
+
+    def halving(self, output_dir, max_episodes = 45, seed = 0):
+        # 6 configurations for 5 episodes, the best 2 for 15, and the best one for 45
+        return self.run_quietly(trainQLearningAgent.successive_halving, LRS, EPS, min_episodes=5,
+                                max_episodes=max_episodes, eta=3, seed=seed, workers=2, output_dir=output_dir, window=5)
+
+    def test_grid_workers(self):
+        summaries, results = [], []
+        for workers in [1, 2]:
+            output_dir = self.output_dir(f"workers_{workers}")
+            summary = self.run_quietly(trainQLearningAgent.grid_search, [0.5, 1.0], [0.1], episodes=20,
+                                       workers=workers, output_dir=output_dir, window=5)
+            summaries.append(without_time(summary))
+            results.append(read_results(output_dir))
+        self.assertEqual(summaries[0], summaries[1])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(len(results[0]), 4)
+
+    def test_halving_rungs(self):
+        output_dir = self.output_dir('sweep')
+        summary = self.halving(output_dir)
+        self.assertEqual(sorted(row['episodes'] for row in summary), [5, 5, 5, 5, 15, 45])
+
+        ## Survivors of every rung are the best configurations on their last 5 returns of that rung
+        def last_returns(row, episodes):
+            with open(os.path.join(output_dir, f"{trainQLearningAgent.config_name(row['lr'], row['eps'])}_returns.txt")) as f:
+                returns = [float(line) for line in f]
+            self.assertEqual(len(returns), row['episodes'])
+            return sum(returns[episodes - 5:episodes]) / 5
+
+        for episodes in [5, 15]:
+            survivors = [last_returns(row, episodes) for row in summary if row['episodes'] > episodes]
+            stopped = [last_returns(row, episodes) for row in summary if row['episodes'] == episodes]
+            self.assertGreaterEqual(min(survivors), max(stopped))
+
+    def test_halving_resume(self):
+        uninterrupted = self.output_dir('uninterrupted')
+        expected = without_time(self.halving(uninterrupted))
+        restarted = self.output_dir('restarted')
+        ## A sweep stopped after the rung of 15 episodes, then restarted
+        self.halving(restarted, max_episodes=15)
+        self.assertEqual(without_time(self.halving(restarted)), expected)
+        self.assertEqual(read_results(restarted), read_results(uninterrupted))
+
+    def test_halving_checkpoint_errors(self):
+        output_dir = self.output_dir('sweep')
+        self.halving(output_dir, max_episodes=5)
+        with self.assertRaisesRegex(Exception, "another output directory"):
+            self.halving(output_dir, max_episodes=5, seed=1)
+        os.remove(os.path.join(output_dir, f"{trainQLearningAgent.config_name(LRS[0], EPS[0])}_qtable.npz"))
+        with self.assertRaisesRegex(Exception, "has no Q-table"):
+            self.halving(output_dir, max_episodes=5)
+
+if __name__ == '__main__':
+    unittest.main()